@@ -0,0 +1,23 @@
+"""Index for listing all chat sessions by age
+
+- chat_sessions (created_at, id): the session listing sorted by creation
+  time without a workflow filter, which otherwise sorts the whole table
+
+Revision ID: 0a5c8e2f4d69
+Revises: 2d6f8a0c4e15
+Create Date: 2026-10-19 11:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0a5c8e2f4d69"
+down_revision = "2d6f8a0c4e15"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_chat_sessions_created_at_id", "chat_sessions", ["created_at", "id"])
+
+def downgrade():
+    op.drop_index("ix_chat_sessions_created_at_id", table_name="chat_sessions")
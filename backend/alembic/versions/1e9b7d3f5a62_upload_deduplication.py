@@ -0,0 +1,42 @@
+"""Upload deduplication
+
+Identical uploads are stored once: documents.content_hash becomes unique,
+and document_workflows links a stored document into further workflows.
+Where earlier uploads already share a hash, only the oldest document keeps
+it; the others are left as independent, unhashed documents.
+
+Revision ID: 1e9b7d3f5a62
+Revises: 8d2f4b6a0c57
+Create Date: 2026-10-19 09:15:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "1e9b7d3f5a62"
+down_revision = "8d2f4b6a0c57"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute(
+        "UPDATE documents SET content_hash = NULL "
+        "WHERE content_hash IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM documents WHERE content_hash IS NOT NULL GROUP BY content_hash)"
+    )
+    op.create_index("ix_documents_content_hash", "documents", ["content_hash"], unique=True)
+
+    op.create_table(
+        "document_workflows",
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("workflow_id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["document_id"], ["documents.id"]),
+        sa.ForeignKeyConstraint(["workflow_id"], ["workflows.id"]),
+        sa.PrimaryKeyConstraint("document_id", "workflow_id")
+    )
+    op.create_index("ix_document_workflows_workflow_id", "document_workflows", ["workflow_id"])
+
+def downgrade():
+    op.drop_table("document_workflows")
+    op.drop_index("ix_documents_content_hash", table_name="documents")
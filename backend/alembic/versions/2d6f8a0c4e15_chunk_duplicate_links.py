@@ -0,0 +1,28 @@
+"""Near-duplicate chunk links
+
+document_chunks.duplicate_of names the chunk whose vector stands in for a
+near-duplicate chunk that was not embedded. The link is cleared when the
+chunk gets a vector of its own.
+
+Revision ID: 2d6f8a0c4e15
+Revises: 4b8e6a2c0d97
+Create Date: 2026-10-19 09:45:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "2d6f8a0c4e15"
+down_revision = "4b8e6a2c0d97"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("document_chunks") as batch_op:
+        batch_op.add_column(sa.Column("duplicate_of", sa.String(length=64), nullable=True))
+    op.create_index("ix_document_chunks_duplicate_of", "document_chunks", ["duplicate_of"])
+
+def downgrade():
+    op.drop_index("ix_document_chunks_duplicate_of", table_name="document_chunks")
+    with op.batch_alter_table("document_chunks") as batch_op:
+        batch_op.drop_column("duplicate_of")
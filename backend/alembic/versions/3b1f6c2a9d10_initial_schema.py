@@ -0,0 +1,95 @@
+"""Initial schema
+
+The schema as first shipped, before chunk tracking, upload deduplication
+and the blob store. Databases created by app.database.init_db from that
+schema should be stamped with this revision before upgrading.
+
+Revision ID: 3b1f6c2a9d10
+Revises:
+Create Date: 2026-10-19 09:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "3b1f6c2a9d10"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "workflows",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("components", sa.JSON(), nullable=True),
+        sa.Column("connections", sa.JSON(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_workflows_id", "workflows", ["id"])
+
+    op.create_table(
+        "documents",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("filename", sa.String(length=255), nullable=False),
+        sa.Column("file_path", sa.String(length=500), nullable=False),
+        sa.Column("file_size", sa.Integer(), nullable=True),
+        sa.Column("file_type", sa.String(length=50), nullable=True),
+        sa.Column("content", sa.Text(), nullable=True),
+        sa.Column("processed", sa.Boolean(), nullable=True),
+        sa.Column("workflow_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["workflow_id"], ["workflows.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_documents_id", "documents", ["id"])
+
+    op.create_table(
+        "components",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("workflow_id", sa.Integer(), nullable=False),
+        sa.Column("component_type", sa.String(length=50), nullable=False),
+        sa.Column("position", sa.JSON(), nullable=True),
+        sa.Column("configuration", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["workflow_id"], ["workflows.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_components_id", "components", ["id"])
+
+    op.create_table(
+        "chat_sessions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("workflow_id", sa.Integer(), nullable=False),
+        sa.Column("session_name", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["workflow_id"], ["workflows.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_chat_sessions_id", "chat_sessions", ["id"])
+
+    op.create_table(
+        "chat_messages",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("session_id", sa.Integer(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("is_user", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["session_id"], ["chat_sessions.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_chat_messages_id", "chat_messages", ["id"])
+
+def downgrade():
+    op.drop_table("chat_messages")
+    op.drop_table("chat_sessions")
+    op.drop_table("components")
+    op.drop_table("documents")
+    op.drop_table("workflows")
@@ -0,0 +1,48 @@
+"""Maintained message counts and last activity on chat sessions
+
+chat_sessions.message_count and last_activity_at are updated with every
+message insert, so the session listing reads them from the sessions table
+instead of grouping all of chat_messages. Existing sessions are backfilled
+from their messages; a session without messages counts its creation as
+its last activity.
+
+Revision ID: 4b8e6a2c0d97
+Revises: 7e4a0d5c2b81
+Create Date: 2026-10-19 09:40:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "4b8e6a2c0d97"
+down_revision = "7e4a0d5c2b81"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("chat_sessions") as batch_op:
+        batch_op.add_column(sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("last_activity_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True))
+
+    op.execute(
+        "UPDATE chat_sessions SET "
+        "message_count = (SELECT COUNT(*) FROM chat_messages WHERE chat_messages.session_id = chat_sessions.id), "
+        "last_activity_at = COALESCE("
+        "(SELECT MAX(chat_messages.created_at) FROM chat_messages WHERE chat_messages.session_id = chat_sessions.id), "
+        "chat_sessions.created_at)"
+    )
+
+    op.create_index("ix_chat_sessions_last_activity_at_id", "chat_sessions", ["last_activity_at", "id"])
+    op.create_index(
+        "ix_chat_sessions_workflow_id_last_activity_at_id",
+        "chat_sessions",
+        ["workflow_id", "last_activity_at", "id"]
+    )
+
+def downgrade():
+    op.drop_index("ix_chat_sessions_workflow_id_last_activity_at_id", table_name="chat_sessions")
+    op.drop_index("ix_chat_sessions_last_activity_at_id", table_name="chat_sessions")
+
+    with op.batch_alter_table("chat_sessions") as batch_op:
+        batch_op.drop_column("last_activity_at")
+        batch_op.drop_column("message_count")
@@ -0,0 +1,32 @@
+"""Chunk ownership registry
+
+document_chunks records which vector store ids belong to which document,
+so deletes and orphan purges do not have to scan the vector store.
+
+Revision ID: 5a7c9e1b3d24
+Revises: 3b1f6c2a9d10
+Create Date: 2026-10-19 09:05:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5a7c9e1b3d24"
+down_revision = "3b1f6c2a9d10"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "document_chunks",
+        sa.Column("id", sa.String(length=64), nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("chunk_index", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(["document_id"], ["documents.id"]),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index("ix_document_chunks_document_id", "document_chunks", ["document_id"])
+
+def downgrade():
+    op.drop_table("document_chunks")
@@ -0,0 +1,20 @@
+"""Keyset pagination index for a workflow's documents
+
+Revision ID: 6c4a2e8b9f13
+Revises: 1e9b7d3f5a62
+Create Date: 2026-10-19 09:20:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "6c4a2e8b9f13"
+down_revision = "1e9b7d3f5a62"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_documents_workflow_id_id", "documents", ["workflow_id", "id"])
+
+def downgrade():
+    op.drop_index("ix_documents_workflow_id_id", table_name="documents")
@@ -0,0 +1,33 @@
+"""Composite indexes for chat history and workflow lookups
+
+- chat_messages (session_id, created_at): ordered session history, and the
+  per-session message counts and last activity of the session listing
+- chat_sessions (workflow_id, created_at): a workflow's sessions by age
+- document_workflows (workflow_id, document_id): the linked documents that
+  WorkflowService adds to a workflow's search filter, read from the index
+  alone; replaces the single-column workflow_id index
+
+Revision ID: 7e4a0d5c2b81
+Revises: 9f1d3b5c7e48
+Create Date: 2026-10-19 09:30:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7e4a0d5c2b81"
+down_revision = "9f1d3b5c7e48"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_chat_messages_session_id_created_at", "chat_messages", ["session_id", "created_at"])
+    op.create_index("ix_chat_sessions_workflow_id_created_at", "chat_sessions", ["workflow_id", "created_at"])
+    op.create_index("ix_document_workflows_workflow_id_document_id", "document_workflows", ["workflow_id", "document_id"])
+    op.drop_index("ix_document_workflows_workflow_id", table_name="document_workflows")
+
+def downgrade():
+    op.create_index("ix_document_workflows_workflow_id", "document_workflows", ["workflow_id"])
+    op.drop_index("ix_document_workflows_workflow_id_document_id", table_name="document_workflows")
+    op.drop_index("ix_chat_sessions_workflow_id_created_at", table_name="chat_sessions")
+    op.drop_index("ix_chat_messages_session_id_created_at", table_name="chat_messages")
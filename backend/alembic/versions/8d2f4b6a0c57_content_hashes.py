@@ -0,0 +1,38 @@
+"""Content hashes for incremental re-ingestion
+
+- documents.content_hash: SHA-256 of the uploaded file
+- documents.processed_at: when the current version was indexed
+- document_chunks.content_hash: SHA-256 of the chunk text; chunks
+  registered before this revision get an empty hash and are re-embedded
+  the next time their document is replaced
+
+Revision ID: 8d2f4b6a0c57
+Revises: 5a7c9e1b3d24
+Create Date: 2026-10-19 09:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "8d2f4b6a0c57"
+down_revision = "5a7c9e1b3d24"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("processed_at", sa.DateTime(timezone=True), nullable=True))
+
+    with op.batch_alter_table("document_chunks") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=False, server_default=""))
+    with op.batch_alter_table("document_chunks") as batch_op:
+        batch_op.alter_column("content_hash", server_default=None)
+
+def downgrade():
+    with op.batch_alter_table("document_chunks") as batch_op:
+        batch_op.drop_column("content_hash")
+
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("processed_at")
+        batch_op.drop_column("content_hash")
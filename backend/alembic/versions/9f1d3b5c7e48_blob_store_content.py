@@ -0,0 +1,82 @@
+"""Move extracted text out of the documents table
+
+documents.content is replaced by content_ref, the blob store key of the
+zstd-compressed text, and content_size, its uncompressed size in bytes.
+Existing text is written to the blob store (settings.blob_store_path)
+before the column is dropped, so this revision needs a live connection
+and cannot be rendered with --sql.
+
+Revision ID: 9f1d3b5c7e48
+Revises: 6c4a2e8b9f13
+Create Date: 2026-10-19 09:25:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.blob_service import blob_service
+
+# revision identifiers, used by Alembic.
+revision = "9f1d3b5c7e48"
+down_revision = "6c4a2e8b9f13"
+branch_labels = None
+depends_on = None
+
+# Rows copied per query, so large tables are never loaded at once
+BATCH_SIZE = 100
+
+def _require_online():
+    if op.get_context().as_sql:
+        raise RuntimeError("Revision 9f1d3b5c7e48 moves document text and must run against a live database")
+
+def _iter_rows(connection, column: str):
+    """Yield (id, value) of documents with a non-null column, in id order"""
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.text(
+                f"SELECT id, {column} FROM documents "
+                f"WHERE {column} IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": BATCH_SIZE}
+        ).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+def upgrade():
+    _require_online()
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.add_column(sa.Column("content_ref", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("content_size", sa.Integer(), nullable=True))
+
+    connection = op.get_bind()
+    for document_id, content in _iter_rows(connection, "content"):
+        # Synchronous form of blob_service.put_text(); nothing else runs
+        # during the migration, so the pin is dropped straight away
+        blob = blob_service._write_text([content])
+        blob_service.unpin(blob["key"])
+        connection.execute(
+            sa.text("UPDATE documents SET content_ref = :key, content_size = :size WHERE id = :id"),
+            {"key": blob["key"], "size": blob["size"], "id": document_id}
+        )
+
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("content")
+
+def downgrade():
+    _require_online()
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.add_column(sa.Column("content", sa.Text(), nullable=True))
+
+    # Blobs stay in the store; other copies of the database may share them
+    connection = op.get_bind()
+    for document_id, key in _iter_rows(connection, "content_ref"):
+        connection.execute(
+            sa.text("UPDATE documents SET content = :content WHERE id = :id"),
+            {"content": blob_service._read_text(key), "id": document_id}
+        )
+
+    with op.batch_alter_table("documents") as batch_op:
+        batch_op.drop_column("content_size")
+        batch_op.drop_column("content_ref")
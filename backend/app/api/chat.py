@@ -1,12 +1,14 @@
 """
 Chat API endpoints
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from app.database.connection import get_db
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.connection import get_async_db
 from app.database.models import ChatSession, ChatMessage, Workflow
+from app.database.queries import SESSION_SORTS, session_messages, session_page
 from app.services.workflow_service import workflow_service
 import logging
 import uuid
@@ -16,6 +18,14 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _record_activity(session_id: str, messages: int, at: datetime):
+    """Statement bumping a session's message count and last activity; run it in the insert's transaction"""
+    return (
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(message_count=ChatSession.message_count + messages, last_activity_at=at)
+    )
+
 class ChatMessageCreate(BaseModel):
     content: str
     workflow_id: str
@@ -24,6 +34,7 @@ class ChatSessionResponse(BaseModel):
     id: str
     workflow_id: str
     created_at: str
+    last_activity_at: str
     message_count: int
 
 class ChatMessageResponse(BaseModel):
@@ -35,27 +46,29 @@ class ChatMessageResponse(BaseModel):
 
 @router.post("/sessions", response_model=Dict[str, Any])
 async def create_chat_session(
-    workflow_id: str,
-    db: Session = Depends(get_db)
+    workflow_id: int,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new chat session"""
     try:
         # Verify workflow exists
-        workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+        workflow = await db.get(Workflow, workflow_id)
         if not workflow:
             raise HTTPException(status_code=404, detail="Workflow not found")
         
         # Create new chat session
         session_id = str(uuid.uuid4())
+        now = datetime.utcnow()
         chat_session = ChatSession(
             id=session_id,
             workflow_id=workflow_id,
-            created_at=datetime.utcnow()
+            created_at=now,
+            last_activity_at=now
         )
         
         db.add(chat_session)
-        db.commit()
-        db.refresh(chat_session)
+        await db.commit()
+        await db.refresh(chat_session)
         
         logger.info(f"Created chat session: {session_id}")
         
@@ -72,44 +85,56 @@ async def create_chat_session(
         logger.error(f"Error creating chat session: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Orderings the session listing supports
 @router.get("/sessions", response_model=List[Dict[str, Any]])
-async def list_chat_sessions(db: Session = Depends(get_db)):
-    """List all chat sessions"""
+async def list_chat_sessions(
+    workflow_id: Optional[int] = None,
+    sort: str = Query("last_activity", description="last_activity or created_at, newest first"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List chat sessions with their message counts
+    
+    Counts and last activity are columns maintained as messages are saved,
+    so a page is a range scan of a sessions index and never touches the
+    messages table.
+    """
     try:
-        sessions = db.query(ChatSession).all()
+        if sort not in SESSION_SORTS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SESSION_SORTS)}")
         
-        result = []
-        for session in sessions:
-            message_count = db.query(ChatMessage).filter(
-                ChatMessage.session_id == session.id
-            ).count()
-            
-            result.append({
-                "id": session.id,
-                "workflow_id": session.workflow_id,
-                "created_at": session.created_at.isoformat(),
-                "message_count": message_count
-            })
+        rows = (await db.execute(session_page(workflow_id, sort, limit, offset))).all()
         
-        return result
+        return [
+            {
+                "id": row.id,
+                "workflow_id": row.workflow_id,
+                "created_at": row.created_at.isoformat(),
+                "last_activity_at": (row.last_activity_at or row.created_at).isoformat(),
+                "message_count": row.message_count
+            }
+            for row in rows
+        ]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing chat sessions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sessions/{session_id}", response_model=Dict[str, Any])
-async def get_chat_session(session_id: str, db: Session = Depends(get_db)):
+async def get_chat_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get a specific chat session with messages"""
     try:
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        session = await db.get(ChatSession, session_id)
         
         if not session:
             raise HTTPException(status_code=404, detail="Chat session not found")
         
         # Get messages for this session
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at).all()
+        messages = (await db.scalars(session_messages(session_id))).all()
         
         message_list = [
             {
@@ -139,12 +164,12 @@ async def get_chat_session(session_id: str, db: Session = Depends(get_db)):
 async def send_message(
     session_id: str,
     message_data: ChatMessageCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a message in a chat session"""
     try:
         # Verify session exists
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        session = await db.get(ChatSession, session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Chat session not found")
         
@@ -158,7 +183,8 @@ async def send_message(
         )
         
         db.add(user_message)
-        db.commit()
+        await db.execute(_record_activity(session_id, 1, user_message.created_at))
+        await db.commit()
         
         # Execute workflow to get response
         workflow_result = await workflow_service.execute_workflow(
@@ -177,7 +203,8 @@ async def send_message(
                 created_at=datetime.utcnow()
             )
             db.add(error_message)
-            db.commit()
+            await db.execute(_record_activity(session_id, 1, error_message.created_at))
+            await db.commit()
             
             return {
                 "success": False,
@@ -199,7 +226,8 @@ async def send_message(
         )
         
         db.add(bot_message)
-        db.commit()
+        await db.execute(_record_activity(session_id, 1, bot_message.created_at))
+        await db.commit()
         
         logger.info(f"Processed message in session: {session_id}")
         
@@ -218,17 +246,15 @@ async def send_message(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sessions/{session_id}/messages", response_model=List[Dict[str, Any]])
-async def get_session_messages(session_id: str, db: Session = Depends(get_db)):
+async def get_session_messages(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get all messages for a chat session"""
     try:
         # Verify session exists
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        session = await db.get(ChatSession, session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Chat session not found")
         
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.created_at).all()
+        messages = (await db.scalars(session_messages(session_id))).all()
         
         return [
             {
@@ -247,20 +273,20 @@ async def get_session_messages(session_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/sessions/{session_id}", response_model=Dict[str, Any])
-async def delete_chat_session(session_id: str, db: Session = Depends(get_db)):
+async def delete_chat_session(session_id: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a chat session and all its messages"""
     try:
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        session = await db.get(ChatSession, session_id)
         
         if not session:
             raise HTTPException(status_code=404, detail="Chat session not found")
         
-        # Delete all messages first
-        db.query(ChatMessage).filter(ChatMessage.session_id == session_id).delete()
+        # Delete all messages first; a bulk delete avoids loading them for the cascade
+        await db.execute(delete(ChatMessage).where(ChatMessage.session_id == session_id))
         
         # Delete session
-        db.delete(session)
-        db.commit()
+        await db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+        await db.commit()
         
         logger.info(f"Deleted chat session: {session_id}")
         
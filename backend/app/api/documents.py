@@ -1,13 +1,24 @@
 """
 Document API endpoints
 """
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from typing import List, Dict, Any
-from sqlalchemy.orm import Session
-from app.database.connection import get_db
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Response
+from typing import List, Dict, Any, Optional
+from pydantic import BaseModel
+import aiofiles
+import hashlib
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.core.config import settings
+from app.database.connection import get_async_db
 from app.database.models import Document
-from app.services.document_service import document_service
+from app.database.queries import document_page
+from app.services.document_service import document_service, SUPPORTED_TYPES
+from app.services.blob_service import blob_service
 from app.services.chroma_service import chroma_service
+from app.services.index_maintenance_service import index_maintenance_service
+from app.services.ingestion_pipeline import ingestion_pipeline
+from app.services.workflow_service import workflow_service
 import logging
 import os
 import uuid
@@ -17,110 +28,317 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def _save_upload(file: UploadFile, file_path: str) -> Dict[str, Any]:
+    """
+    Stream an upload to disk in fixed-size chunks
+    
+    Size and SHA-256 are computed as bytes arrive, so memory per upload stays
+    constant and the write never blocks the event loop.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    
+    try:
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(settings.upload_chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await buffer.write(chunk)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    
+    return {
+        "file_size": size,
+        "content_hash": digest.hexdigest()
+    }
+
 @router.post("/upload", response_model=Dict[str, Any])
 async def upload_document(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    workflow_id: Optional[int] = Form(None)
 ):
-    """Upload and process a document"""
+    """
+    Upload a document and queue it for processing
+    
+    Returns as soon as the file is stored; poll /jobs/{job_id} for progress.
+    """
     try:
         # Save uploaded file
-        file_id = str(uuid.uuid4())
         file_extension = os.path.splitext(file.filename)[1]
-        file_path = f"uploads/{file_id}{file_extension}"
+        file_path = os.path.join(settings.upload_dir, f"{uuid.uuid4()}{file_extension}")
+        
+        upload = await _save_upload(file, file_path)
+        
+        # Extract, chunk, embed and index in the background; identical
+        # content already stored is linked instead of processed again
+        return await ingestion_pipeline.ingest_upload(
+            file_path,
+            file.filename,
+            upload["file_size"],
+            upload["content_hash"],
+            workflow_id
+        )
+        
+    except Exception as e:
+        logger.error(f"Error uploading document: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload/archive", response_model=Dict[str, Any])
+async def upload_archive(
+    file: UploadFile = File(...),
+    workflow_id: Optional[int] = Form(None)
+):
+    """
+    Upload a zip or tar archive and ingest every supported file in it
+    
+    Returns once the archive is stored; entries are read and queued in the
+    background. Poll /batches/{batch_id} for per-file progress.
+    """
+    try:
+        archive_path = os.path.join(
+            settings.upload_dir, "archives", f"{uuid.uuid4()}{os.path.splitext(file.filename)[1]}"
+        )
+        await _save_upload(file, archive_path)
+        
+        batch = ingestion_pipeline.submit_archive(archive_path, file.filename, workflow_id)
         
-        os.makedirs("uploads", exist_ok=True)
+        logger.info(f"Uploaded archive {file.filename}, ingestion batch {batch['batch_id']}")
         
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        return batch
+        
+    except Exception as e:
+        logger.error(f"Error uploading archive: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload/batch", response_model=Dict[str, Any])
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    workflow_id: Optional[int] = Form(None)
+):
+    """Upload several documents in one request and ingest them as a batch"""
+    try:
+        batch = ingestion_pipeline.create_batch(f"{len(files)} files", workflow_id)
+        
+        for file in files:
+            file_extension = os.path.splitext(file.filename)[1].lower()
+            if file_extension not in SUPPORTED_TYPES:
+                entry = {"filename": file.filename, "error": f"Unsupported file type: {file_extension or 'unknown'}"}
+            else:
+                file_path = os.path.join(settings.upload_dir, f"{uuid.uuid4()}{file_extension}")
+                try:
+                    entry = {"filename": file.filename, "file_path": file_path, **await _save_upload(file, file_path)}
+                except Exception as e:
+                    entry = {"filename": file.filename, "error": str(e)}
+            await ingestion_pipeline.add_to_batch(batch, entry, workflow_id)
+        
+        batch["status"] = "processing"
+        
+        return ingestion_pipeline.get_batch(batch["batch_id"])
+        
+    except Exception as e:
+        logger.error(f"Error uploading batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/batches/{batch_id}", response_model=Dict[str, Any])
+async def get_ingestion_batch(batch_id: str):
+    """Get per-file progress of an archive or multi-file upload"""
+    batch = ingestion_pipeline.get_batch(batch_id)
+    
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return batch
+
+@router.put("/{document_id}", response_model=Dict[str, Any])
+async def replace_document(
+    document_id: int,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Re-upload a document, re-embedding only chunks whose content changed"""
+    try:
+        document = await db.get(Document, document_id)
+        
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        # Save the new version next to the old one until it is processed
+        file_extension = os.path.splitext(file.filename)[1]
+        file_path = os.path.join(settings.upload_dir, f"{uuid.uuid4()}{file_extension}")
+        
+        upload = await _save_upload(file, file_path)
+        
+        # Identical bytes need no extraction at all
+        if upload["content_hash"] == document.content_hash:
+            os.remove(file_path)
+            return {
+                "success": True,
+                "document_id": document.id,
+                "chunks_added": 0,
+                "chunks_removed": 0,
+                "message": "Document unchanged"
+            }
+        
+        duplicate = await db.scalar(
+            select(Document).where(
+                Document.content_hash == upload["content_hash"],
+                Document.id != document.id
+            )
+        )
+        if duplicate:
+            os.remove(file_path)
+            raise HTTPException(
+                status_code=409,
+                detail=f"Identical content is already stored as document {duplicate.id}"
+            )
         
-        # Process document
         result = await document_service.process_document(file_path)
         
         if not result["success"]:
-            # Clean up file if processing failed
             os.remove(file_path)
             raise HTTPException(status_code=400, detail=result["error"])
         
-        # Save document metadata to database
-        document = Document(
-            filename=file.filename,
-            file_path=file_path,
-            file_size=len(content),
-            file_type=file_extension,
-            content_hash=result["metadata"]["content_hash"],
-            processed_at=datetime.utcnow()
-        )
-        
-        db.add(document)
-        db.commit()
-        db.refresh(document)
+        old_file_path = document.file_path
+        old_content_ref = document.content_ref
+        # End the read transaction; the chunk sync commits through its own session
+        await db.commit()
         
-        # Chunk document for vector storage
+        blob = await blob_service.put_text(result["content"])
         chunks = await document_service.chunk_document(result["content"])
         
-        # Add chunks to ChromaDB
-        chunk_texts = [chunk["text"] for chunk in chunks]
-        chunk_metadatas = [
-            {
-                **chunk,
-                "document_id": str(document.id),
-                "filename": file.filename
-            }
-            for chunk in chunks
-        ]
-        chunk_ids = [f"{document.id}_{chunk['chunk_index']}" for chunk in chunks]
+        # The new version is only recorded once its vectors are stored
+        sync_result = None
+        try:
+            sync_result = await ingestion_pipeline.sync_document_chunks(document.id, chunks, {
+                "filename": file.filename,
+                "file_path": file_path,
+                "file_size": upload["file_size"],
+                "file_type": file_extension,
+                "content_hash": upload["content_hash"],
+                "content_ref": blob["key"],
+                "content_size": blob["size"],
+                "processed_at": datetime.utcnow()
+            })
+        finally:
+            blob_service.unpin(blob["key"])
+            if not (sync_result and sync_result["success"]):
+                # The document keeps its previous version
+                os.remove(file_path)
+                await blob_service.release(blob["key"])
         
-        chroma_result = await chroma_service.add_documents(
-            documents=chunk_texts,
-            metadatas=chunk_metadatas,
-            ids=chunk_ids
-        )
+        if not sync_result["success"]:
+            raise HTTPException(status_code=502, detail=sync_result["error"])
+        
+        if old_file_path != file_path and os.path.exists(old_file_path):
+            os.remove(old_file_path)
+        if old_content_ref != blob["key"]:
+            await blob_service.release(old_content_ref)
         
-        logger.info(f"Uploaded and processed document: {document.id}")
+        logger.info(
+            f"Re-ingested document {document.id}: {sync_result['chunks_added']} added, "
+            f"{sync_result['chunks_removed']} removed"
+        )
         
         return {
-            "success": True,
             "document_id": document.id,
-            "filename": file.filename,
-            "file_size": len(content),
-            "chunks_created": len(chunks),
-            "chroma_success": chroma_result["success"],
-            "message": "Document uploaded and processed successfully"
+            **sync_result,
+            "message": "Document re-ingested successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error uploading document: {e}")
+        logger.error(f"Error replacing document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Columns the listing can return
+LISTABLE_FIELDS = {
+    "id": Document.id,
+    "filename": Document.filename,
+    "file_size": Document.file_size,
+    "file_type": Document.file_type,
+    "workflow_id": Document.workflow_id,
+    "processed_at": Document.processed_at,
+    "created_at": Document.created_at,
+    "content_hash": Document.content_hash,
+    "content_size": Document.content_size
+}
+DEFAULT_LIST_FIELDS = "id,filename,file_size,file_type,processed_at,content_hash"
+
 @router.get("/", response_model=List[Dict[str, Any]])
-async def list_documents(db: Session = Depends(get_db)):
-    """List all documents"""
+async def list_documents(
+    response: Response,
+    workflow_id: Optional[int] = None,
+    file_type: Optional[str] = None,
+    after: Optional[int] = Query(None, description="Return documents with an ID above this cursor"),
+    limit: int = Query(100, ge=1, le=1000),
+    fields: str = Query(DEFAULT_LIST_FIELDS, description="Comma-separated columns to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List documents one page at a time
+    
+    Pages are ordered by ID and continue from the `after` cursor, so each page
+    is an index range scan no matter how deep it is. When more documents
+    follow, the cursor for the next page is sent in the X-Next-Cursor header.
+    """
     try:
-        documents = db.query(Document).all()
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in LISTABLE_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        
+        # The cursor column is always selected, even if not returned
+        query = document_page(
+            [LISTABLE_FIELDS[name] for name in names],
+            workflow_id=workflow_id,
+            file_type=(file_type if file_type.startswith(".") else f".{file_type}") if file_type else None,
+            after=after,
+            limit=limit
+        )
+        
+        # The page holds one extra row to learn whether another page exists
+        rows = (await db.execute(query)).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = str(rows[-1][0])
         
         return [
             {
-                "id": document.id,
-                "filename": document.filename,
-                "file_size": document.file_size,
-                "file_type": document.file_type,
-                "processed_at": document.processed_at.isoformat(),
-                "content_hash": document.content_hash
+                name: value.isoformat() if hasattr(value, "isoformat") else value
+                for name, value in zip(names, row[1:])
             }
-            for document in documents
+            for row in rows
         ]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error listing documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_ingestion_job(job_id: str):
+    """Get the progress of a document ingestion job"""
+    job = ingestion_pipeline.get_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
 @router.get("/{document_id}", response_model=Dict[str, Any])
-async def get_document(document_id: str, db: Session = Depends(get_db)):
+async def get_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific document"""
     try:
-        document = db.query(Document).filter(Document.id == document_id).first()
+        document = await db.get(Document, document_id)
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -131,8 +349,9 @@ async def get_document(document_id: str, db: Session = Depends(get_db)):
             "file_path": document.file_path,
             "file_size": document.file_size,
             "file_type": document.file_type,
-            "processed_at": document.processed_at.isoformat(),
-            "content_hash": document.content_hash
+            "processed_at": document.processed_at.isoformat() if document.processed_at else None,
+            "content_hash": document.content_hash,
+            "content_size": document.content_size
         }
         
     except HTTPException:
@@ -141,34 +360,120 @@ async def get_document(document_id: str, db: Session = Depends(get_db)):
         logger.error(f"Error getting document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{document_id}/content", response_model=Dict[str, Any])
+async def get_document_content(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get a document's extracted text from the blob store"""
+    try:
+        row = (await db.execute(
+            select(Document.content_ref, Document.content_size).where(Document.id == document_id)
+        )).first()
+        
+        if not row:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        content = await blob_service.get_text(row.content_ref) if row.content_ref else None
+        if content is None:
+            raise HTTPException(status_code=404, detail="Document has no extracted content")
+        
+        return {
+            "id": document_id,
+            "content": content,
+            "content_size": row.content_size
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting document content: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/{document_id}", response_model=Dict[str, Any])
-async def delete_document(document_id: str, db: Session = Depends(get_db)):
-    """Delete a document"""
+async def delete_document(
+    document_id: int,
+    workflow_id: Optional[int] = Query(None, description="Only remove the document from this workflow"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Delete a document
+    
+    With a workflow_id, the document is only removed from that workflow
+    while other workflows still use it: a link is dropped, and a document
+    removed from the workflow that owns it is handed over to a linked one.
+    It is deleted outright once no workflow uses it.
+    """
     try:
-        document = db.query(Document).filter(Document.id == document_id).first()
+        # The delete cascades to chunks and workflow links, so load them up front
+        document = await db.scalar(
+            select(Document)
+            .where(Document.id == document_id)
+            .options(selectinload(Document.chunks), selectinload(Document.workflow_links))
+        )
         
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Delete from ChromaDB
-        # Find all chunk IDs for this document
-        stats = await chroma_service.get_collection_stats()
-        if stats["success"]:
-            # This is a simplified approach - in production you'd want to track chunk IDs
-            pass
+        if workflow_id is not None:
+            linked = [link.workflow_id for link in document.workflow_links]
+            if workflow_id != document.workflow_id and workflow_id not in linked:
+                raise HTTPException(status_code=404, detail="Document not found in workflow")
+            
+            remaining = [linked_id for linked_id in linked if linked_id != workflow_id]
+            if workflow_id != document.workflow_id and (remaining or document.workflow_id is not None):
+                link = next(link for link in document.workflow_links if link.workflow_id == workflow_id)
+                await db.delete(link)
+                await db.commit()
+                logger.info(f"Removed document {document_id} from workflow {workflow_id}")
+                return {
+                    "success": True,
+                    "chunks_deleted": 0,
+                    "message": "Document removed from workflow"
+                }
+            if workflow_id == document.workflow_id and remaining:
+                transfer_result = await ingestion_pipeline.transfer_document(document_id, remaining[0])
+                if not transfer_result["success"]:
+                    raise HTTPException(status_code=502, detail=transfer_result["error"])
+                logger.info(f"Handed document {document_id} over from workflow {workflow_id} to {remaining[0]}")
+                return {
+                    "success": True,
+                    "chunks_deleted": 0,
+                    "workflow_id": remaining[0],
+                    "message": "Document removed from workflow"
+                }
+        
+        # Delete the document's chunks from the vector store in bulk
+        chunk_ids = [chunk.id for chunk in document.chunks]
+        if not chunk_ids:
+            # Documents ingested before chunk registration: find chunks by owner
+            async for ids, _ in chroma_service.iter_metadata(where={"document_id": str(document.id)}):
+                chunk_ids.extend(ids)
+        
+        if chunk_ids:
+            # Near-duplicates in other documents lose their stand-in; store their own vectors first
+            detach_result = await ingestion_pipeline.detach_duplicates(chunk_ids)
+            if not detach_result["success"]:
+                raise HTTPException(status_code=502, detail=detach_result["error"])
+            
+            chroma_result = await chroma_service.delete_documents(chunk_ids)
+            if not chroma_result["success"]:
+                raise HTTPException(status_code=502, detail=chroma_result["error"])
         
         # Delete file
         if os.path.exists(document.file_path):
             os.remove(document.file_path)
         
         # Delete from database
-        db.delete(document)
-        db.commit()
+        content_ref = document.content_ref
+        await db.delete(document)
+        await db.commit()
+        
+        # Extracted text may be shared with documents of identical content
+        await blob_service.release(content_ref)
         
         logger.info(f"Deleted document: {document_id}")
         
         return {
             "success": True,
+            "chunks_deleted": len(chunk_ids),
             "message": "Document deleted successfully"
         }
         
@@ -182,18 +487,114 @@ async def delete_document(document_id: str, db: Session = Depends(get_db)):
 async def search_documents(
     query: str,
     n_results: int = 5,
-    similarity_threshold: float = 0.7
+    similarity_threshold: float = 0.7,
+    workflow_id: Optional[int] = None
 ):
     """Search documents using vector similarity"""
     try:
         result = await chroma_service.search_documents(
             query=query,
             n_results=n_results,
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            filter_metadata=await workflow_service.workflow_filter(workflow_id) if workflow_id is not None else None
         )
         
         return result
         
     except Exception as e:
         logger.error(f"Error searching documents: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    n_results: int = 5
+    similarity_threshold: float = 0.7
+    workflow_id: Optional[int] = None
+
+@router.post("/search/batch", response_model=Dict[str, Any])
+async def search_documents_batch(request: BatchSearchRequest):
+    """Search documents for several queries in one round-trip"""
+    try:
+        result = await chroma_service.search_documents_batch(
+            queries=request.queries,
+            n_results=request.n_results,
+            similarity_threshold=request.similarity_threshold,
+            filter_metadata=await workflow_service.workflow_filter(request.workflow_id) if request.workflow_id is not None else None
+        )
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error batch searching documents: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/maintenance/compact", response_model=Dict[str, Any])
+async def compact_index():
+    """Purge orphaned vectors and compact the vector index"""
+    try:
+        result = await index_maintenance_service.run_compaction()
+        
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["error"])
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error compacting index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class SnapshotRequest(BaseModel):
+    name: str
+    compress: bool = True
+
+def _snapshot_path(name: str) -> str:
+    """Resolve a snapshot name inside the snapshot directory"""
+    filename = os.path.basename(name)
+    if not filename or filename in (".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid snapshot name")
+    if not filename.endswith(".npz"):
+        filename += ".npz"
+    return os.path.join(settings.vector_snapshot_dir, filename)
+
+@router.post("/maintenance/snapshot/export", response_model=Dict[str, Any])
+async def export_snapshot(request: SnapshotRequest):
+    """Export the vector collection to a snapshot file"""
+    try:
+        result = await chroma_service.export_snapshot(
+            _snapshot_path(request.name),
+            compress=request.compress
+        )
+        
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["error"])
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting snapshot: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/maintenance/snapshot/import", response_model=Dict[str, Any])
+async def import_snapshot(request: SnapshotRequest):
+    """Load a snapshot file into the vector collection"""
+    try:
+        path = _snapshot_path(request.name)
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        
+        result = await chroma_service.import_snapshot(path)
+        
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["error"])
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing snapshot: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -4,9 +4,11 @@ Workflow API endpoints
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.database.connection import get_db
+from app.database.connection import get_async_db
 from app.database.models import Workflow, Component
 from app.services.workflow_service import workflow_service
 import logging
@@ -29,10 +31,13 @@ class WorkflowExecute(BaseModel):
     user_input: str
     session_id: Optional[str] = None
 
+class WorkflowBatchExecute(BaseModel):
+    user_inputs: List[str]
+
 @router.post("/", response_model=Dict[str, Any])
 async def create_workflow(
     workflow_data: WorkflowCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new workflow"""
     try:
@@ -49,8 +54,8 @@ async def create_workflow(
         )
         
         db.add(workflow)
-        db.commit()
-        db.refresh(workflow)
+        await db.commit()
+        await db.refresh(workflow)
         
         logger.info(f"Created workflow: {workflow.id}")
         
@@ -65,10 +70,10 @@ async def create_workflow(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/", response_model=List[Dict[str, Any]])
-async def list_workflows(db: Session = Depends(get_db)):
+async def list_workflows(db: AsyncSession = Depends(get_async_db)):
     """List all workflows"""
     try:
-        workflows = db.query(Workflow).all()
+        workflows = (await db.scalars(select(Workflow))).all()
         
         return [
             {
@@ -86,10 +91,10 @@ async def list_workflows(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{workflow_id}", response_model=Dict[str, Any])
-async def get_workflow(workflow_id: str, db: Session = Depends(get_db)):
+async def get_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific workflow"""
     try:
-        workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+        workflow = await db.get(Workflow, workflow_id)
         
         if not workflow:
             raise HTTPException(status_code=404, detail="Workflow not found")
@@ -111,13 +116,13 @@ async def get_workflow(workflow_id: str, db: Session = Depends(get_db)):
 
 @router.put("/{workflow_id}", response_model=Dict[str, Any])
 async def update_workflow(
-    workflow_id: str,
+    workflow_id: int,
     workflow_data: WorkflowUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a workflow"""
     try:
-        workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+        workflow = await db.get(Workflow, workflow_id)
         
         if not workflow:
             raise HTTPException(status_code=404, detail="Workflow not found")
@@ -134,8 +139,8 @@ async def update_workflow(
                 raise HTTPException(status_code=400, detail=validation_result["error"])
             workflow.definition = workflow_data.definition
         
-        db.commit()
-        db.refresh(workflow)
+        await db.commit()
+        await db.refresh(workflow)
         
         logger.info(f"Updated workflow: {workflow_id}")
         
@@ -151,16 +156,25 @@ async def update_workflow(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/{workflow_id}", response_model=Dict[str, Any])
-async def delete_workflow(workflow_id: str, db: Session = Depends(get_db)):
+async def delete_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a workflow"""
     try:
-        workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+        # Related rows are detached on delete, so load them up front
+        workflow = await db.scalar(
+            select(Workflow)
+            .where(Workflow.id == workflow_id)
+            .options(
+                selectinload(Workflow.documents),
+                selectinload(Workflow.components_rel),
+                selectinload(Workflow.chat_sessions)
+            )
+        )
         
         if not workflow:
             raise HTTPException(status_code=404, detail="Workflow not found")
         
-        db.delete(workflow)
-        db.commit()
+        await db.delete(workflow)
+        await db.commit()
         
         logger.info(f"Deleted workflow: {workflow_id}")
         
@@ -177,9 +191,8 @@ async def delete_workflow(workflow_id: str, db: Session = Depends(get_db)):
 
 @router.post("/{workflow_id}/execute", response_model=Dict[str, Any])
 async def execute_workflow(
-    workflow_id: str,
-    execution_data: WorkflowExecute,
-    db: Session = Depends(get_db)
+    workflow_id: int,
+    execution_data: WorkflowExecute
 ):
     """Execute a workflow"""
     try:
@@ -200,6 +213,29 @@ async def execute_workflow(
         logger.error(f"Error executing workflow: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/{workflow_id}/execute/batch", response_model=Dict[str, Any])
+async def execute_workflow_batch(
+    workflow_id: int,
+    execution_data: WorkflowBatchExecute
+):
+    """Execute a workflow for several inputs"""
+    try:
+        result = await workflow_service.execute_workflow_batch(
+            workflow_id=workflow_id,
+            user_inputs=execution_data.user_inputs
+        )
+        
+        if not result["success"] and "results" not in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing workflow batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/validate", response_model=Dict[str, Any])
 async def validate_workflow_definition(definition: Dict[str, Any]):
     """Validate a workflow definition"""
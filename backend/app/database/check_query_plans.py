@@ -0,0 +1,176 @@
+"""
+Query plan checks for the chat and document hot paths
+
+Migrates a scratch SQLite database to head, seeds it, and asserts that the
+statements built in app/database/queries.py for the chat API, the document
+list and WorkflowService are served by their indexes. Run from the backend
+directory:
+
+    python -m app.database.check_query_plans
+
+tests/test_query_plans.py runs the same checks under pytest.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text, insert
+from sqlalchemy.dialects import sqlite
+
+from app.database.models import Workflow, Document, DocumentWorkflow, ChatSession, ChatMessage
+from app.database.queries import session_messages, session_page, linked_document_ids, document_page
+
+WORKFLOWS = 50
+SESSIONS_PER_WORKFLOW = 40
+MESSAGES_PER_SESSION = 25
+DOCUMENTS_PER_WORKFLOW = 20
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def migrate(url: str):
+    """Build the schema from the migrations rather than the models"""
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+def seed(connection):
+    start = datetime(2024, 1, 1)
+    connection.execute(insert(Workflow), [
+        {"id": w, "name": f"workflow {w}"} for w in range(1, WORKFLOWS + 1)
+    ])
+    connection.execute(insert(Document), [
+        {
+            "id": d,
+            "filename": f"document-{d}.txt",
+            "file_path": f"uploads/document-{d}.txt",
+            "workflow_id": d % WORKFLOWS + 1,
+            "content_hash": f"{d:064x}"
+        }
+        for d in range(1, WORKFLOWS * DOCUMENTS_PER_WORKFLOW + 1)
+    ])
+    connection.execute(insert(DocumentWorkflow), [
+        {"document_id": d, "workflow_id": (d + 7) % WORKFLOWS + 1}
+        for d in range(1, WORKFLOWS * DOCUMENTS_PER_WORKFLOW + 1, 3)
+    ])
+    sessions = WORKFLOWS * SESSIONS_PER_WORKFLOW
+    connection.execute(insert(ChatSession), [
+        {
+            "id": s,
+            "workflow_id": s % WORKFLOWS + 1,
+            "created_at": start + timedelta(minutes=s),
+            "message_count": MESSAGES_PER_SESSION,
+            "last_activity_at": start + timedelta(minutes=s, seconds=MESSAGES_PER_SESSION - 1)
+        }
+        for s in range(1, sessions + 1)
+    ])
+    connection.execute(insert(ChatMessage), [
+        {
+            "session_id": s,
+            "content": f"message {m}",
+            "is_user": m % 2 == 0,
+            "created_at": start + timedelta(minutes=s, seconds=m)
+        }
+        for s in range(1, sessions + 1)
+        for m in range(MESSAGES_PER_SESSION)
+    ])
+    connection.execute(text("ANALYZE"))
+
+def hot_queries():
+    """Statements as built for the chat API, the document list and WorkflowService, with expected plan fragments"""
+    return [
+        (
+            "session history",
+            session_messages(17),
+            ["USING INDEX ix_chat_messages_session_id_created_at"]
+        ),
+        (
+            "sessions by last activity",
+            session_page(sort="last_activity"),
+            ["USING INDEX ix_chat_sessions_last_activity_at_id"]
+        ),
+        (
+            "workflow sessions by last activity",
+            session_page(workflow_id=3, sort="last_activity"),
+            ["USING INDEX ix_chat_sessions_workflow_id_last_activity_at_id"]
+        ),
+        (
+            "sessions by age",
+            session_page(sort="created_at"),
+            ["USING INDEX ix_chat_sessions_created_at_id"]
+        ),
+        (
+            "workflow sessions by age",
+            session_page(workflow_id=3, sort="created_at"),
+            ["USING INDEX ix_chat_sessions_workflow_id_created_at"]
+        ),
+        (
+            "documents linked into a workflow",
+            linked_document_ids(3),
+            ["USING COVERING INDEX ix_document_workflows_workflow_id_document_id"]
+        ),
+        (
+            "document page",
+            document_page([Document.filename], after=100),
+            ["USING INTEGER PRIMARY KEY"]
+        ),
+        (
+            "workflow document page",
+            document_page([Document.filename], workflow_id=3, after=100),
+            [
+                "USING COVERING INDEX ix_documents_workflow_id_id",
+                "USING COVERING INDEX ix_document_workflows_workflow_id_document_id"
+            ]
+        ),
+        (
+            "workflow document page of one file type",
+            document_page([Document.filename], workflow_id=3, file_type=".txt", after=100),
+            [
+                "USING INDEX ix_documents_workflow_id_id",
+                "USING COVERING INDEX ix_document_workflows_workflow_id_document_id"
+            ]
+        )
+    ]
+
+def check_plans(connection) -> list:
+    failures = []
+    for name, statement, expected in hot_queries():
+        sql = str(statement.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        plan = " | ".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+        missing = [fragment for fragment in expected if fragment not in plan]
+        if "USE TEMP B-TREE" in plan:
+            missing.append("no temporary sort")
+        if missing:
+            failures.append(f"{name}: expected {', '.join(missing)}; plan was: {plan}")
+        print(f"{'ok  ' if not missing else 'FAIL'} {name}: {plan}")
+    return failures
+
+def run_checks() -> list:
+    """Migrate, seed and check a scratch database; returns the failures"""
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'plans.db')}"
+        migrate(url)
+
+        engine = create_engine(url)
+        try:
+            with engine.begin() as connection:
+                seed(connection)
+            with engine.connect() as connection:
+                failures = check_plans(connection)
+        finally:
+            engine.dispose()
+    return failures
+
+def main() -> int:
+    failures = run_checks()
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,43 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
+def _pool_options(url: URL) -> dict:
+    """Connection pool settings; SQLite uses its own single-file pooling"""
+    options = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if url.get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle
+        )
+    return options
+
+def _async_url(url: URL) -> URL:
+    """Switch the configured database URL to its asyncio driver"""
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg").update_query_dict({
+            "prepared_statement_cache_size": str(settings.db_statement_cache_size)
+        })
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+database_url = make_url(settings.database_url)
+
 # Create database engine
-engine = create_engine(settings.database_url)
+engine = create_engine(database_url, **_pool_options(database_url))
+
+# Async engine used by the API endpoints so queries never block the event loop
+async_engine = create_async_engine(_async_url(database_url), **_pool_options(database_url))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Create base class for models
 Base = declarative_base()
@@ -20,6 +50,7 @@ def get_db():
     finally:
         db.close()
 
-
-
-
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
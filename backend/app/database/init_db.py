@@ -1,6 +1,6 @@
 from sqlalchemy import create_engine
 from app.database.connection import Base, engine
-from app.database.models import Workflow, Document, Component, ChatSession, ChatMessage
+from app.database.models import Workflow, Document, DocumentChunk, DocumentWorkflow, Component, ChatSession, ChatMessage
 
 def create_tables():
     """Create all database tables"""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database.connection import Base
@@ -28,14 +28,54 @@ class Document(Base):
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer)
     file_type = Column(String(50))
-    content = Column(Text)
+    content_ref = Column(String(64))  # Blob store key of the extracted text
+    content_size = Column(Integer)  # Extracted text size in bytes
+    content_hash = Column(String(64), unique=True, index=True)  # SHA-256 of the uploaded file
     processed = Column(Boolean, default=False)
+    processed_at = Column(DateTime(timezone=True))
     workflow_id = Column(Integer, ForeignKey("workflows.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     workflow = relationship("Workflow", back_populates="documents")
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
+    workflow_links = relationship("DocumentWorkflow", back_populates="document", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Keyset pagination of a workflow's documents
+        Index("ix_documents_workflow_id_id", "workflow_id", "id"),
+    )
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+    
+    id = Column(String(64), primary_key=True)  # Vector store ID of the chunk
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=False)  # SHA-256 of the chunk text
+    # Near-duplicate chunks have no vector of their own; this names the chunk that stands in
+    duplicate_of = Column(String(64), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    document = relationship("Document", back_populates="chunks")
+
+class DocumentWorkflow(Base):
+    __tablename__ = "document_workflows"
+    
+    # Links a stored document into workflows other than the one it was uploaded to
+    document_id = Column(Integer, ForeignKey("documents.id"), primary_key=True)
+    workflow_id = Column(Integer, ForeignKey("workflows.id"), primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    document = relationship("Document", back_populates="workflow_links")
+    
+    __table_args__ = (
+        # Index-only lookup of the documents linked into a workflow
+        Index("ix_document_workflows_workflow_id_document_id", "workflow_id", "document_id"),
+    )
 
 class Component(Base):
     __tablename__ = "components"
@@ -57,12 +97,24 @@ class ChatSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False)
     session_name = Column(String(255))
+    # Maintained with each message insert so listings never aggregate chat_messages
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_activity_at = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     workflow = relationship("Workflow", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Sessions newest first, overall and per workflow
+        Index("ix_chat_sessions_created_at_id", "created_at", "id"),
+        Index("ix_chat_sessions_workflow_id_created_at", "workflow_id", "created_at"),
+        # Sessions by most recent activity, overall and per workflow
+        Index("ix_chat_sessions_last_activity_at_id", "last_activity_at", "id"),
+        Index("ix_chat_sessions_workflow_id_last_activity_at_id", "workflow_id", "last_activity_at", "id"),
+    )
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -75,6 +127,11 @@ class ChatMessage(Base):
     
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
+    
+    __table_args__ = (
+        # Session history in order
+        Index("ix_chat_messages_session_id_created_at", "session_id", "created_at"),
+    )
 
 
 
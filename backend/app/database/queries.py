@@ -0,0 +1,102 @@
+"""
+Statement builders for hot read paths
+
+The endpoints issue these statements and check_query_plans.py checks the
+plans of the very same statements, so the two cannot drift apart.
+"""
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import Select, select, union
+
+from app.database.models import Document, DocumentWorkflow, ChatSession, ChatMessage
+
+SESSION_SORTS = ("last_activity", "created_at")
+
+def session_messages(session_id: int) -> Select:
+    """A chat session's messages, oldest first"""
+    return (
+        select(ChatMessage)
+        .where(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.created_at)
+    )
+
+def session_page(
+    workflow_id: Optional[int] = None,
+    sort: str = "last_activity",
+    limit: int = 50,
+    offset: int = 0
+) -> Select:
+    """
+    One page of chat sessions with their maintained counts, newest first
+
+    Args:
+        workflow_id: Only sessions of this workflow
+        sort: One of SESSION_SORTS
+        limit: Page size
+        offset: Sessions to skip
+    """
+    query = select(
+        ChatSession.id,
+        ChatSession.workflow_id,
+        ChatSession.created_at,
+        ChatSession.message_count,
+        ChatSession.last_activity_at
+    )
+    if workflow_id is not None:
+        query = query.where(ChatSession.workflow_id == workflow_id)
+
+    order = ChatSession.last_activity_at if sort == "last_activity" else ChatSession.created_at
+    return query.order_by(order.desc(), ChatSession.id.desc()).limit(limit).offset(offset)
+
+def linked_document_ids(workflow_id: int) -> Select:
+    """IDs of the documents linked into a workflow"""
+    return select(DocumentWorkflow.document_id).where(DocumentWorkflow.workflow_id == workflow_id)
+
+def document_page(
+    columns: Sequence[Any],
+    workflow_id: Optional[int] = None,
+    file_type: Optional[str] = None,
+    after: Optional[int] = None,
+    limit: int = 100
+) -> Select:
+    """
+    One keyset page of documents ordered by ID, plus one row to detect a next page
+
+    A workflow's documents are those uploaded to it and those linked into
+    it. An OR across both can only be answered by walking the primary key,
+    so each side is paged from its own index and only the page IDs are
+    merged.
+
+    Args:
+        columns: Columns selected after Document.id
+        workflow_id: Only documents uploaded to or linked into this workflow
+        file_type: Only documents of this extension, with the leading dot
+        after: Cursor; only documents with a higher ID
+        limit: Page size
+
+    Returns:
+        Select of (Document.id, *columns)
+    """
+    query = select(Document.id, *columns)
+    if file_type:
+        query = query.where(Document.file_type == file_type)
+
+    if workflow_id is not None:
+        uploaded = select(Document.id).where(Document.workflow_id == workflow_id)
+        linked = select(DocumentWorkflow.document_id).where(DocumentWorkflow.workflow_id == workflow_id)
+        if file_type:
+            uploaded = uploaded.where(Document.file_type == file_type)
+            linked = linked.join(Document, Document.id == DocumentWorkflow.document_id).where(
+                Document.file_type == file_type
+            )
+        if after is not None:
+            uploaded = uploaded.where(Document.id > after)
+            linked = linked.where(DocumentWorkflow.document_id > after)
+        uploaded = uploaded.order_by(Document.id).limit(limit + 1).subquery()
+        linked = linked.order_by(DocumentWorkflow.document_id).limit(limit + 1).subquery()
+        page_ids = union(select(uploaded.c.id), select(linked.c.document_id)).subquery()
+        query = query.where(Document.id.in_(select(page_ids.c.id)))
+    elif after is not None:
+        query = query.where(Document.id > after)
+
+    return query.order_by(Document.id).limit(limit + 1)
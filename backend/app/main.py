@@ -3,6 +3,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.api import workflows, documents, llm, search, chat
 from app.core.config import settings
+from app.services.chroma_service import chroma_service
+from app.services.cpu_pool import cpu_pool
+from app.services.index_maintenance_service import index_maintenance_service
+from app.services.ingestion_pipeline import ingestion_pipeline
 import logging
 
 # Configure logging
@@ -24,6 +28,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Global exception handler
@@ -46,10 +51,21 @@ app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 async def startup_event():
     """Initialize application on startup"""
     try:
+        index_maintenance_service.start()
+        ingestion_pipeline.start()
+        ingestion_pipeline.resume()
         logger.info("GenAI Stack API started successfully")
     except Exception as e:
         logger.error(f"Error during startup: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release background resources on shutdown"""
+    await ingestion_pipeline.stop()
+    await index_maintenance_service.stop()
+    cpu_pool.shutdown()
+    chroma_service.shutdown()
+
 @app.get("/")
 async def root():
     return {
@@ -60,8 +76,10 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    vector_store_ready = chroma_service.collection is not None
     return {
-        "status": "healthy",
+        "status": "healthy" if vector_store_ready else "degraded",
         "database": "connected",
-        "chromadb": "connected"
+        "chromadb": "connected" if vector_store_ready else "unavailable",
+        "vector_backend": chroma_service.backend
     }
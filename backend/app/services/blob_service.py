@@ -0,0 +1,148 @@
+"""
+Blob Service - Content-addressed, zstd-compressed storage for extracted text
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from typing import List, Dict, Any, Optional, Iterable
+
+import zstandard
+
+from app.core.config import settings
+from app.database.connection import SessionLocal
+from app.database.models import Document
+
+logger = logging.getLogger(__name__)
+
+class BlobService:
+    def __init__(self):
+        self.root = settings.blob_store_path
+        self.level = settings.blob_compression_level
+        # Blobs written but not yet referenced by a committed document row,
+        # counted per writer; release() never deletes a pinned blob
+        self._pinned: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        """Fan blobs out over two directory levels to keep directories small"""
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.zst")
+
+    def _write_text(self, pieces: Iterable[str]) -> Dict[str, Any]:
+        """
+        Compress text pieces into the store
+
+        The key is the SHA-256 of the UTF-8 text, computed while compressing
+        to a temporary file; identical text is stored once. The blob is
+        pinned before it is placed, so a concurrent release() of the same
+        key cannot delete it between the write and the document commit.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".{uuid.uuid4()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                with zstandard.ZstdCompressor(level=self.level).stream_writer(f, closefd=False) as writer:
+                    for piece in pieces:
+                        data = piece.encode("utf-8")
+                        digest.update(data)
+                        size += len(data)
+                        writer.write(data)
+
+            key = digest.hexdigest()
+            path = self._path(key)
+            stored_size = os.path.getsize(tmp_path)
+            with self._lock:
+                self._pinned[key] = self._pinned.get(key, 0) + 1
+                if os.path.exists(path):
+                    os.remove(tmp_path)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return {
+            "key": key,
+            "size": size,
+            "stored_size": stored_size
+        }
+
+    def _read_text(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            with zstandard.ZstdDecompressor().stream_reader(f) as reader:
+                return reader.read().decode("utf-8")
+
+    async def put_text(self, pieces: List[str]) -> Dict[str, Any]:
+        """
+        Store text and return its key and sizes
+
+        The blob stays pinned until unpin() is called, which callers do once
+        the document row referencing it is committed or abandoned.
+
+        Args:
+            pieces: Text, in order, as extracted page by page
+
+        Returns:
+            Dict with the blob key, uncompressed size and stored size in bytes
+        """
+        return await asyncio.to_thread(self._write_text, pieces)
+
+    async def get_text(self, key: str) -> Optional[str]:
+        """Load and decompress stored text, or None if it is missing"""
+        return await asyncio.to_thread(self._read_text, key)
+
+    def delete(self, key: str):
+        """
+        Remove a blob
+
+        Blobs are shared by every document with identical text; callers must
+        check that no other document references the key.
+        """
+        path = self._path(key)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logger.error(f"Error deleting blob {key}: {e}")
+
+    def unpin(self, key: Optional[str]):
+        """Drop one writer's pin on a blob returned by put_text()"""
+        if not key:
+            return
+        with self._lock:
+            count = self._pinned.get(key, 0) - 1
+            if count > 0:
+                self._pinned[key] = count
+            else:
+                self._pinned.pop(key, None)
+
+    def _release(self, key: str):
+        # Held across the check and the delete so a writer cannot place
+        # the same key in between
+        with self._lock:
+            if key in self._pinned:
+                return
+            db = SessionLocal()
+            try:
+                referenced = db.query(Document.id).filter(Document.content_ref == key).first()
+            finally:
+                db.close()
+            if not referenced:
+                self.delete(key)
+
+    async def release(self, key: Optional[str]):
+        """Delete a blob once no document references or pins it any more"""
+        if key:
+            await asyncio.to_thread(self._release, key)
+
+# Global instance
+blob_service = BlobService()
@@ -3,20 +3,59 @@ ChromaDB Service - Handles vector storage and similarity search
 """
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import hashlib
+import json
 import logging
+import os
+from collections import OrderedDict
+import numpy as np
 from app.core.config import settings
+from app.services.dedup_service import dedup_service
+from app.services.embedding_service import embedding_service
+from app.services.keyword_search_service import keyword_search_service
+from app.services.reranking import maximal_marginal_relevance
+from app.services.snapshot import SnapshotWriter, read_snapshot_header, iter_snapshot_pages
+from app.services.vector_index import LocalVectorCollection
 
 logger = logging.getLogger(__name__)
 
+# Metadata key naming the snapshot an imported record came from
+SNAPSHOT_SOURCE_KEY = "snapshot_source"
+
 class ChromaService:
     def __init__(self):
         self.client = None
         self.collection = None
+        self.backend = "chroma"
+        # Query result cache, invalidated by bumping the collection version on writes
+        self.collection_version = 0
+        self._search_cache: OrderedDict = OrderedDict()
+        # The Chroma client is synchronous; run its calls on a dedicated bounded
+        # pool so slow round-trips never block the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.chroma_max_concurrency,
+            thread_name_prefix="chroma"
+        )
         self._initialize_client()
     
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking Chroma client call on the Chroma thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+    
     def _initialize_client(self):
         """Initialize ChromaDB client"""
+        if settings.vector_backend == "local":
+            self._initialize_local_index()
+            return
+        
         try:
             self.client = chromadb.HttpClient(
                 host=settings.chroma_host,
@@ -29,77 +68,252 @@ class ChromaService:
                 metadata={"description": "GenAI Stack document embeddings"}
             )
             
+            self._match_embedding_provider()
             logger.info("ChromaDB client initialized successfully")
             
         except Exception as e:
             logger.error(f"Error initializing ChromaDB client: {e}")
-            # Fallback to in-memory client for development
-            try:
-                self.client = chromadb.Client()
-                self.collection = self.client.get_or_create_collection(
-                    name="genai_documents"
+            if settings.vector_backend_fallback:
+                # Serve from the embedded index; it does not hold the vectors stored in Chroma
+                logger.warning("ChromaDB unreachable, falling back to the local vector index")
+                self._initialize_local_index()
+            else:
+                logger.error(
+                    "Vector store unavailable; start ChromaDB, set VECTOR_BACKEND=local, "
+                    "or set VECTOR_BACKEND_FALLBACK=true to use the local index when ChromaDB is down"
                 )
-                logger.info("ChromaDB fallback client initialized")
-            except Exception as fallback_error:
-                logger.error(f"ChromaDB fallback failed: {fallback_error}")
     
-    async def add_documents(
+    def _match_embedding_provider(self):
+        """
+        Keep embedding with the provider the collection's vectors came from
+
+        Chroma's built-in embeddings and OpenAI's differ in dimension, so a
+        collection filled by one cannot be queried with the other. In "auto"
+        mode the dimension of a stored vector decides; an explicit setting
+        that disagrees with it is reported.
+        """
+        sample = self.collection.peek(limit=1)
+        stored = sample.get("embeddings")
+        if stored is None or not len(stored):
+            return
+        provider = "openai" if len(stored[0]) == embedding_service.dimension else "chroma"
+        if settings.embedding_provider == "auto":
+            if provider != embedding_service.provider:
+                logger.info(f"Collection holds {provider} embeddings, embedding with {provider}")
+            embedding_service.provider = provider
+        elif provider != settings.embedding_provider:
+            logger.error(
+                f"Collection holds {provider} embeddings but embedding_provider is "
+                f"{settings.embedding_provider}; searches will fail until it is re-embedded"
+            )
+    
+    def _initialize_local_index(self):
+        """Initialize the embedded memory-mapped vector index"""
+        try:
+            self.client = None
+            self.collection = LocalVectorCollection(
+                path=settings.vector_index_path,
+                name="genai_documents",
+                nprobe=settings.vector_index_nprobe,
+                min_ivf_size=settings.vector_index_min_ivf_size
+            )
+            self.backend = "local"
+            logger.info("Local vector index initialized")
+        except Exception as e:
+            logger.error(f"Local vector index initialization failed: {e}")
+    
+    def _bump_version(self):
+        """Invalidate cached search results after a write"""
+        self.collection_version += 1
+        self._search_cache.clear()
+    
+    def _embeds_texts(self) -> bool:
+        """
+        Whether the collection embeds texts itself
+        
+        Without an embedding provider, Chroma's own embedding function is used
+        for both stored documents and queries, as before embeddings were
+        computed here. The local index can only store given vectors.
+        """
+        return self.backend == "chroma" and not embedding_service.available
+    
+    async def _embed(self, texts: List[str], cache: bool = True) -> List[List[float]]:
+        """
+        Embed texts with the embedding service
+        
+        When a provider is configured, all vectors, stored and queried, come
+        from EmbeddingService so callers can compute a query embedding once
+        and reuse it across stages. Stored documents bypass the query cache.
+        """
+        if not embedding_service.available:
+            raise Exception("No embedding provider configured for the local vector index")
+        embeddings = await embedding_service.generate_embeddings(texts, cache=cache)
+        if len(embeddings) != len(texts):
+            raise Exception("Embedding generation failed")
+        return embeddings
+    
+    def make_chunk_id(self, document: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Derive a stable ID from chunk content and its owning document"""
+        owner = str((metadata or {}).get("document_id", ""))
+        return hashlib.sha256(f"{owner}\x00{document}".encode("utf-8")).hexdigest()[:32]
+    
+    def _make_batches(self, documents: List[str], batch_size: int, max_bytes: int) -> List[range]:
+        """Split document positions into batches bounded by count and payload size"""
+        batches = []
+        start = 0
+        size = 0
+        for i, document in enumerate(documents):
+            doc_bytes = len(document.encode("utf-8"))
+            if i > start and (i - start >= batch_size or size + doc_bytes > max_bytes):
+                batches.append(range(start, i))
+                start = i
+                size = 0
+            size += doc_bytes
+        if start < len(documents):
+            batches.append(range(start, len(documents)))
+        return batches
+    
+    async def upsert_documents(
         self,
         documents: List[str],
         metadatas: Optional[List[Dict[str, Any]]] = None,
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        batch_size: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """
-        Add documents to the vector store
+        Bulk upsert documents in size-bounded batches with bounded parallelism
         
         Args:
             documents: List of document texts
             metadatas: List of metadata dicts for each document
-            ids: List of unique IDs for each document
+            ids: List of unique IDs; derived from content when omitted so
+                retries overwrite instead of duplicating
+            embeddings: Precomputed embeddings for each document
+            batch_size: Maximum documents per batch
+            on_progress: Called after each batch with a progress dict
             
         Returns:
-            Dict with operation results
+            Dict with operation results and per-batch status
         """
         try:
             if not self.collection:
                 raise Exception("ChromaDB collection not initialized")
             
-            # Generate IDs if not provided
-            if not ids:
-                ids = [f"doc_{i}_{hash(doc) % 10000}" for i, doc in enumerate(documents)]
-            
             # Prepare metadata
             if not metadatas:
                 metadatas = [{} for _ in documents]
             
-            # Add documents to collection
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
+            # Generate IDs if not provided
+            if not ids:
+                ids = [self.make_chunk_id(doc, meta) for doc, meta in zip(documents, metadatas)]
+            
+            batches = self._make_batches(
+                documents,
+                batch_size or settings.chroma_batch_size,
+                settings.chroma_batch_max_bytes
             )
+            semaphore = asyncio.Semaphore(settings.chroma_upsert_concurrency)
+            batch_results: List[Dict[str, Any]] = []
+            progress = {"total_batches": len(batches), "completed_batches": 0, "documents_upserted": 0}
             
-            logger.info(f"Added {len(documents)} documents to ChromaDB")
+            async def send(batch_index: int, positions: range):
+                async with semaphore:
+                    batch_result = {"batch": batch_index, "size": len(positions)}
+                    try:
+                        batch_documents = documents[positions.start:positions.stop]
+                        batch_embeddings = embeddings[positions.start:positions.stop] if embeddings else None
+                        if batch_embeddings is None and not self._embeds_texts():
+                            batch_embeddings = await self._embed(batch_documents, cache=False)
+                        
+                        await self._run(
+                            self.collection.upsert,
+                            documents=batch_documents,
+                            metadatas=metadatas[positions.start:positions.stop],
+                            ids=ids[positions.start:positions.stop],
+                            embeddings=batch_embeddings
+                        )
+                        keyword_search_service.add_documents(
+                            ids[positions.start:positions.stop],
+                            batch_documents,
+                            metadatas[positions.start:positions.stop]
+                        )
+                        batch_result["success"] = True
+                        progress["documents_upserted"] += len(positions)
+                    except Exception as e:
+                        logger.error(f"Error upserting batch {batch_index}: {e}")
+                        batch_result["success"] = False
+                        batch_result["error"] = str(e)
+                    
+                    progress["completed_batches"] += 1
+                    batch_results.append(batch_result)
+                    if on_progress:
+                        on_progress({**progress, **batch_result})
             
-            return {
-                "success": True,
-                "documents_added": len(documents),
-                "ids": ids
+            try:
+                await asyncio.gather(*(send(i, positions) for i, positions in enumerate(batches)))
+            finally:
+                self._bump_version()
+            await keyword_search_service.persist()
+            
+            batch_results.sort(key=lambda result: result["batch"])
+            failed = [result for result in batch_results if not result["success"]]
+            
+            logger.info(
+                f"Upserted {progress['documents_upserted']} documents to ChromaDB "
+                f"in {len(batches)} batches ({len(failed)} failed)"
+            )
+            
+            result = {
+                "success": not failed,
+                "documents_added": progress["documents_upserted"],
+                "ids": ids,
+                "batches": batch_results
             }
+            if failed:
+                result["error"] = failed[0]["error"]
+            return result
             
         except Exception as e:
-            logger.error(f"Error adding documents to ChromaDB: {e}")
+            logger.error(f"Error upserting documents to ChromaDB: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    async def add_documents(
+        self,
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Add documents to the vector store
+        
+        Args:
+            documents: List of document texts
+            metadatas: List of metadata dicts for each document
+            ids: List of unique IDs for each document
+            
+        Returns:
+            Dict with operation results
+        """
+        return await self.upsert_documents(
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+    
     async def search_documents(
         self,
         query: str,
         n_results: int = 5,
         similarity_threshold: float = 0.7,
-        filter_metadata: Optional[Dict[str, Any]] = None
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+        query_embedding: Optional[List[float]] = None,
+        adaptive: bool = True
     ) -> Dict[str, Any]:
         """
         Search for similar documents
@@ -109,47 +323,176 @@ class ChromaService:
             n_results: Number of results to return
             similarity_threshold: Minimum similarity score
             filter_metadata: Metadata filters
+            include_embeddings: Return each result's embedding
+            query_embedding: Precomputed embedding of the query
+            adaptive: Over-fetch until n_results pass the threshold
             
         Returns:
             Dict with search results
         """
+        batch_result = await self.search_documents_batch(
+            queries=[query],
+            n_results=n_results,
+            similarity_threshold=similarity_threshold,
+            filter_metadata=filter_metadata,
+            include_embeddings=include_embeddings,
+            query_embeddings=[query_embedding] if query_embedding else None,
+            adaptive=adaptive
+        )
+        
+        if not batch_result["success"]:
+            return {
+                "success": False,
+                "error": batch_result["error"],
+                "results": []
+            }
+        
+        return {"success": True, **batch_result["results"][0]}
+    
+    async def search_documents_batch(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        similarity_threshold: float = 0.7,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False,
+        query_embeddings: Optional[List[Optional[List[float]]]] = None,
+        adaptive: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Search for several queries in one round-trip
+        
+        Cached queries are answered directly; the rest are embedded and sent
+        to the collection together in a single query call.
+        
+        In adaptive mode a query that has fewer than n_results candidates
+        above the threshold is re-queried with a larger k, growing by
+        search_overfetch_growth up to search_max_candidates. A query stops
+        as soon as its lowest fetched score is under the threshold or the
+        collection has no more candidates, since nothing further can pass.
+        
+        Args:
+            queries: Search query texts
+            n_results: Number of results to return per query
+            similarity_threshold: Minimum similarity score
+            filter_metadata: Metadata filters
+            include_embeddings: Return each result's embedding
+            query_embeddings: Precomputed embeddings aligned with queries;
+                None entries are embedded here
+            adaptive: Over-fetch until n_results pass the threshold
+            
+        Returns:
+            Dict with one result entry per query, in input order
+        """
         try:
             if not self.collection:
                 raise Exception("ChromaDB collection not initialized")
             
-            # Perform similarity search
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                where=filter_metadata
-            )
+            if n_results <= 0:
+                return {
+                    "success": True,
+                    "results": [{"query": query, "results": [], "total_found": 0} for query in queries],
+                    "total_queries": len(queries)
+                }
             
-            # Process results
-            search_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, (doc, metadata, distance) in enumerate(zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                )):
-                    # Convert distance to similarity score
-                    similarity_score = 1 - distance
+            # Writes bump the version, so stale entries can never be served
+            version = self.collection_version
+            filter_key = json.dumps(filter_metadata, sort_keys=True, default=str)
+            cache_keys = [
+                (version, query, n_results, filter_key, similarity_threshold, adaptive)
+                for query in queries
+            ]
+            
+            query_results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+            for i, cache_key in enumerate(cache_keys):
+                cached = self._search_cache.get(cache_key)
+                if cached is not None:
+                    self._search_cache.move_to_end(cache_key)
+                    query_results[i] = {**cached, "results": list(cached["results"]), "cached": True}
+            
+            pending = [i for i, result in enumerate(query_results) if result is None]
+            cached_count = len(queries) - len(pending)
+            
+            # Cached results are stored without embeddings; fetch them for all hits at once
+            if include_embeddings and cached_count:
+                await self._attach_embeddings([result for result in query_results if result is not None])
+            
+            # Embed only queries the caller has not already embedded
+            embeds_texts = self._embeds_texts()
+            embeddings = {
+                i: query_embeddings[i] if query_embeddings else None
+                for i in pending
+            }
+            missing = [i for i in pending if not embeddings[i]]
+            if missing and not embeds_texts:
+                generated = await self._embed([queries[i] for i in missing])
+                embeddings.update(zip(missing, generated))
+            
+            include = ["documents", "metadatas", "distances"]
+            if include_embeddings:
+                include.append("embeddings")
+            
+            fetch_k = n_results
+            max_candidates = max(n_results, settings.search_max_candidates) if adaptive else n_results
+            rounds = 0
+            while pending:
+                rounds += 1
+                if embeds_texts:
+                    query_input = {"query_texts": [queries[i] for i in pending]}
+                else:
+                    query_input = {"query_embeddings": [embeddings[i] for i in pending]}
+                results = await self._run(
+                    self.collection.query,
+                    n_results=fetch_k,
+                    where=filter_metadata,
+                    include=include,
+                    **query_input
+                )
+                
+                unfinished = []
+                for j, i in enumerate(pending):
+                    search_results = self._process_query_results(
+                        results, j, similarity_threshold, include_embeddings
+                    )
+                    distances = results['distances'][j] if results['distances'] else []
+                    exhausted = (
+                        len(distances) < fetch_k
+                        or 1 - distances[-1] < similarity_threshold
+                    )
+                    if len(search_results) < n_results and not exhausted and fetch_k < max_candidates:
+                        unfinished.append(i)
+                        continue
                     
-                    if similarity_score >= similarity_threshold:
-                        search_results.append({
-                            "document": doc,
-                            "metadata": metadata,
-                            "similarity_score": similarity_score,
-                            "rank": i + 1
-                        })
+                    search_results = search_results[:n_results]
+                    response = {
+                        "query": queries[i],
+                        "results": search_results,
+                        "total_found": len(search_results)
+                    }
+                    if settings.search_cache_size > 0 and version == self.collection_version:
+                        # Embeddings would make each entry up to n_results vectors
+                        self._search_cache[cache_keys[i]] = {
+                            **response,
+                            "results": [
+                                {key: value for key, value in result.items() if key != "embedding"}
+                                for result in search_results
+                            ] if include_embeddings else search_results
+                        }
+                        if len(self._search_cache) > settings.search_cache_size:
+                            self._search_cache.popitem(last=False)
+                    query_results[i] = {**response, "results": list(search_results)}
+                
+                pending = unfinished
+                fetch_k = min(fetch_k * max(2, settings.search_overfetch_growth), max_candidates)
             
-            logger.info(f"Found {len(search_results)} relevant documents")
+            logger.info(
+                f"Searched {len(queries)} queries ({cached_count} cached, {rounds} rounds)"
+            )
             
             return {
                 "success": True,
-                "query": query,
-                "results": search_results,
-                "total_found": len(search_results)
+                "results": query_results,
+                "total_queries": len(queries)
             }
             
         except Exception as e:
@@ -160,13 +503,203 @@ class ChromaService:
                 "results": []
             }
     
+    async def _attach_embeddings(self, responses: List[Dict[str, Any]]):
+        """Fill in the embeddings of search responses' results in one collection call"""
+        ids = list({result["id"] for response in responses for result in response["results"]})
+        if not ids:
+            return
+        fetched = await self._run(self.collection.get, ids=ids, include=["embeddings"])
+        embeddings = dict(zip(fetched["ids"], fetched["embeddings"]))
+        for response in responses:
+            response["results"] = [
+                {**result, "embedding": list(embeddings[result["id"]])}
+                for result in response["results"]
+                if result["id"] in embeddings
+            ]
+    
+    def _process_query_results(
+        self,
+        results: Dict[str, Any],
+        index: int,
+        similarity_threshold: float,
+        include_embeddings: bool
+    ) -> List[Dict[str, Any]]:
+        """Convert one query's raw collection results into thresholded search results"""
+        search_results = []
+        if results['documents'] and results['documents'][index]:
+            for i, (doc_id, doc, metadata, distance) in enumerate(zip(
+                results['ids'][index],
+                results['documents'][index],
+                results['metadatas'][index],
+                results['distances'][index]
+            )):
+                # Convert distance to similarity score
+                similarity_score = 1 - distance
+                
+                if similarity_score >= similarity_threshold:
+                    result = {
+                        "id": doc_id,
+                        "document": doc,
+                        "metadata": metadata,
+                        "similarity_score": similarity_score,
+                        "rank": i + 1
+                    }
+                    if include_embeddings:
+                        result["embedding"] = list(results['embeddings'][index][i])
+                    search_results.append(result)
+        return search_results
+    
+    async def hybrid_search(
+        self,
+        query: str,
+        n_results: int = 5,
+        similarity_threshold: float = 0.7,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        candidate_k: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Search with BM25 and vector similarity, fused by reciprocal rank
+        
+        Both retrievers run concurrently and each contributes
+        1 / (rrf_k + rank) per document, so exact identifiers found only by
+        BM25 can outrank loosely related dense matches.
+        
+        Args:
+            query: Search query text
+            n_results: Number of results to return
+            similarity_threshold: Minimum similarity score for dense matches
+            filter_metadata: Metadata filters
+            candidate_k: Candidates fetched from each retriever
+            query_embedding: Precomputed embedding of the query
+            
+        Returns:
+            Dict with fused search results
+        """
+        try:
+            candidate_k = candidate_k or max(n_results * 4, 20)
+            
+            dense_result, keyword_results = await asyncio.gather(
+                self.search_documents(
+                    query=query,
+                    n_results=candidate_k,
+                    similarity_threshold=similarity_threshold,
+                    filter_metadata=filter_metadata,
+                    query_embedding=query_embedding
+                ),
+                asyncio.to_thread(
+                    keyword_search_service.search,
+                    query,
+                    candidate_k,
+                    filter_metadata
+                )
+            )
+            if not dense_result["success"]:
+                raise Exception(dense_result["error"])
+            
+            rrf_k = settings.hybrid_rrf_k
+            fused: Dict[str, Dict[str, Any]] = {}
+            for rank, result in enumerate(dense_result["results"], start=1):
+                entry = fused.setdefault(result["id"], {**result, "rrf_score": 0.0})
+                entry["rrf_score"] += 1 / (rrf_k + rank)
+            for rank, result in enumerate(keyword_results, start=1):
+                entry = fused.setdefault(result["id"], {
+                    "id": result["id"],
+                    "document": None,
+                    "metadata": result["metadata"],
+                    "similarity_score": None,
+                    "rrf_score": 0.0
+                })
+                entry["bm25_score"] = result["bm25_score"]
+                entry["rrf_score"] += 1 / (rrf_k + rank)
+            
+            ranked = sorted(fused.values(), key=lambda entry: entry["rrf_score"], reverse=True)[:n_results]
+            
+            # Keyword-only matches still need their text
+            missing = [entry["id"] for entry in ranked if entry["document"] is None]
+            if missing:
+                fetched = await self._run(self.collection.get, ids=missing)
+                documents = dict(zip(fetched["ids"], fetched["documents"]))
+                for entry in ranked:
+                    if entry["document"] is None:
+                        entry["document"] = documents.get(entry["id"], "")
+            
+            for rank, entry in enumerate(ranked, start=1):
+                entry["rank"] = rank
+            
+            logger.info(f"Hybrid search found {len(ranked)} relevant documents")
+            
+            return {
+                "success": True,
+                "query": query,
+                "results": ranked,
+                "total_found": len(ranked)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in hybrid search: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": []
+            }
+    
+    async def rerank_mmr(
+        self,
+        results: List[Dict[str, Any]],
+        n_results: int = 5,
+        lambda_mult: float = 0.5
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-rank over-fetched results with Maximal Marginal Relevance
+        
+        Relevance comes from each result's fused or similarity score; results
+        retrieved without embeddings have them fetched in one call.
+        
+        Args:
+            results: Candidate results from search_documents or hybrid_search
+            n_results: Number of results to keep
+            lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+            
+        Returns:
+            Selected results, re-ranked
+        """
+        if len(results) <= 1:
+            return results[:n_results]
+        
+        missing = [result["id"] for result in results if result.get("embedding") is None]
+        if missing:
+            fetched = await self._run(self.collection.get, ids=missing, include=["embeddings"])
+            embeddings = dict(zip(fetched["ids"], fetched["embeddings"]))
+            results = [
+                {**result, "embedding": embeddings[result["id"]]} if result["id"] in embeddings else result
+                for result in results
+            ]
+            results = [result for result in results if result.get("embedding") is not None]
+        
+        relevance = np.array([
+            result["rrf_score"] if result.get("rrf_score") is not None else result["similarity_score"]
+            for result in results
+        ])
+        embeddings = np.array([result["embedding"] for result in results], dtype=np.float32)
+        selected = await asyncio.to_thread(
+            maximal_marginal_relevance, relevance, embeddings, n_results, lambda_mult
+        )
+        
+        reranked = []
+        for rank, index in enumerate(selected, start=1):
+            result = {key: value for key, value in results[index].items() if key != "embedding"}
+            result["rank"] = rank
+            reranked.append(result)
+        return reranked
+    
     async def get_document_by_id(self, doc_id: str) -> Dict[str, Any]:
         """Get a specific document by ID"""
         try:
             if not self.collection:
                 raise Exception("ChromaDB collection not initialized")
             
-            results = self.collection.get(ids=[doc_id])
+            results = await self._run(self.collection.get, ids=[doc_id])
             
             if results['documents'] and results['documents'][0]:
                 return {
@@ -187,13 +720,51 @@ class ChromaService:
                 "error": str(e)
             }
     
+    async def get_vectors(self, doc_ids: List[str]) -> Dict[str, Any]:
+        """Get the stored text, metadata and embedding of each of the given IDs that exists"""
+        try:
+            if not self.collection:
+                raise Exception("ChromaDB collection not initialized")
+            
+            results = await self._run(
+                self.collection.get, ids=doc_ids, include=["documents", "metadatas", "embeddings"]
+            )
+            
+            return {
+                "success": True,
+                "records": {
+                    doc_id: {"document": document, "metadata": metadata or {}, "embedding": list(embedding)}
+                    for doc_id, document, metadata, embedding in zip(
+                        results["ids"], results["documents"], results["metadatas"], results["embeddings"]
+                    )
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting vectors: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     async def delete_documents(self, doc_ids: List[str]) -> Dict[str, Any]:
-        """Delete documents by IDs"""
+        """Delete documents by IDs in size-bounded batches"""
         try:
             if not self.collection:
                 raise Exception("ChromaDB collection not initialized")
             
-            self.collection.delete(ids=doc_ids)
+            try:
+                for start in range(0, len(doc_ids), settings.chroma_batch_size):
+                    await self._run(
+                        self.collection.delete,
+                        ids=doc_ids[start:start + settings.chroma_batch_size]
+                    )
+            finally:
+                self._bump_version()
+            keyword_search_service.delete_documents(doc_ids)
+            await keyword_search_service.persist()
+            dedup_service.release(doc_ids)
+            await dedup_service.persist()
             
             logger.info(f"Deleted {len(doc_ids)} documents")
             
@@ -209,13 +780,174 @@ class ChromaService:
                 "error": str(e)
             }
     
+    async def iter_metadata(
+        self,
+        where: Optional[Dict[str, Any]] = None,
+        page_size: int = 1000
+    ) -> AsyncIterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """Page through stored IDs and metadata without loading documents or vectors"""
+        if not self.collection:
+            raise Exception("ChromaDB collection not initialized")
+        
+        offset = 0
+        while True:
+            page = await self._run(
+                self.collection.get,
+                where=where,
+                include=["metadatas"],
+                limit=page_size,
+                offset=offset
+            )
+            if not page["ids"]:
+                return
+            yield page["ids"], page["metadatas"]
+            offset += len(page["ids"])
+    
+    async def export_snapshot(
+        self,
+        path: str,
+        compress: bool = True,
+        page_size: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        Export ids, documents, metadata and vectors to a snapshot file
+        
+        Records are fetched and written one page at a time, so the export
+        never holds more than one page in memory.
+        
+        Args:
+            path: Target .npz file
+            compress: Compress the snapshot
+            page_size: Records fetched per collection call
+            
+        Returns:
+            Dict with the snapshot header
+        """
+        try:
+            if not self.collection:
+                raise Exception("ChromaDB collection not initialized")
+            
+            writer = await asyncio.to_thread(
+                SnapshotWriter,
+                path, compress,
+                {"collection": self.collection.name, "backend": self.backend}
+            )
+            try:
+                offset = 0
+                while True:
+                    page = await self._run(
+                        self.collection.get,
+                        include=["documents", "metadatas", "embeddings"],
+                        limit=page_size,
+                        offset=offset
+                    )
+                    if not page["ids"]:
+                        break
+                    await asyncio.to_thread(
+                        writer.write_page,
+                        page["ids"], page["documents"], page["metadatas"], page["embeddings"]
+                    )
+                    offset += len(page["ids"])
+                
+                header = await asyncio.to_thread(writer.close)
+            except Exception:
+                await asyncio.to_thread(writer.abort)
+                raise
+            
+            logger.info(f"Exported {header['count']} vectors to snapshot {path}")
+            
+            return {
+                "success": True,
+                "path": path,
+                **header
+            }
+            
+        except Exception as e:
+            logger.error(f"Error exporting snapshot: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def import_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        Load a snapshot into the collection without re-embedding
+        
+        Records are upserted page by page, so importing into a populated
+        collection overwrites matching ids and keeps the rest. Imported
+        records are tagged with the snapshot name in their metadata; the
+        documents they came from usually do not exist on this node, and the
+        tag keeps index maintenance from purging them as orphans.
+        
+        Args:
+            path: Snapshot .npz file
+            
+        Returns:
+            Dict with operation results
+        """
+        try:
+            header = await asyncio.to_thread(read_snapshot_header, path)
+            source = os.path.basename(path)
+            pages = iter_snapshot_pages(path)
+            
+            documents_added = 0
+            while True:
+                page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    break
+                result = await self.upsert_documents(
+                    documents=page["documents"],
+                    metadatas=[{**metadata, SNAPSHOT_SOURCE_KEY: source} for metadata in page["metadatas"]],
+                    ids=page["ids"],
+                    embeddings=page["embeddings"].tolist()
+                )
+                if not result["success"]:
+                    raise Exception(result["error"])
+                documents_added += result["documents_added"]
+            
+            logger.info(f"Imported {documents_added} vectors from snapshot {path}")
+            
+            return {
+                "success": True,
+                "documents_added": documents_added,
+                "path": path,
+                "dimension": header["dimension"]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error importing snapshot: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def compact(self) -> Dict[str, Any]:
+        """Reclaim space held by deleted vectors"""
+        try:
+            if not self.collection:
+                raise Exception("ChromaDB collection not initialized")
+            
+            if self.backend != "local":
+                # Chroma manages its own storage; deletes are already physical
+                return {"success": True, "backend": self.backend}
+            
+            result = await self._run(self.collection.compact)
+            return {"success": True, "backend": self.backend, **result}
+            
+        except Exception as e:
+            logger.error(f"Error compacting vector index: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
     async def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics"""
         try:
             if not self.collection:
                 raise Exception("ChromaDB collection not initialized")
             
-            count = self.collection.count()
+            count = await self._run(self.collection.count)
             
             return {
                 "success": True,
@@ -239,6 +971,10 @@ class ChromaService:
             return False
         except Exception:
             return False
+    
+    def shutdown(self):
+        """Stop the Chroma thread pool"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
 # Global instance
 chroma_service = ChromaService()
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+CPU Pool - Shared process pool for CPU-bound work
+"""
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class CPUPool:
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the process pool on first use"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=settings.ingestion_workers)
+            logger.info(f"CPU process pool started with {settings.ingestion_workers} workers")
+        return self._executor
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Run a CPU-bound function in the process pool without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def shutdown(self):
+        """Stop the process pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+cpu_pool = CPUPool()
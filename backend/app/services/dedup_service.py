@@ -0,0 +1,173 @@
+"""
+Dedup Service - Near-duplicate chunk detection with a persistent SimHash index
+
+Fingerprints are grouped by partition (the owning workflow), and a chunk
+only counts as a duplicate of a chunk in its own partition, so skipping it
+never hides content from a workflow-filtered search.
+"""
+import logging
+from typing import Any, List, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.services.index_journal import IndexJournal
+
+logger = logging.getLogger(__name__)
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+
+class DedupService:
+    def __init__(self):
+        self.journal = IndexJournal(settings.dedup_index_path)
+        self.max_distance = settings.dedup_max_distance
+        self.signatures: Dict[str, int] = {}
+        self.partitions: Dict[str, str] = {}
+        self.bands: Dict[str, List[str]] = {}
+        self._load()
+
+    def _band_keys(self, signature: int, partition: str) -> List[str]:
+        """Split a fingerprint into bands used as LSH buckets within its partition"""
+        mask = (1 << BAND_BITS) - 1
+        return [
+            f"{partition}/{band}:{signature >> (band * BAND_BITS) & mask}"
+            for band in range(BANDS)
+        ]
+
+    def _load(self):
+        """Load persisted fingerprints and rebuild the band buckets"""
+        try:
+            entries, changes = self.journal.load()
+            for chunk_id, (signature, partition) in entries.items():
+                self._add(chunk_id, signature, partition)
+            for change in changes:
+                if change[0] == "add":
+                    self._add(*change[1:])
+                else:
+                    self._remove(change[1])
+            if entries or changes:
+                logger.info(f"Loaded {len(self.signatures)} chunk fingerprints")
+        except Exception as e:
+            logger.error(f"Error loading dedup index: {e}")
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            chunk_id: (signature, self.partitions[chunk_id])
+            for chunk_id, signature in self.signatures.items()
+        }
+
+    def _index(self, chunk_id: str, signature: int, partition: str):
+        """Add a chunk and queue the change for persist()"""
+        self._add(chunk_id, signature, partition)
+        self.journal.record(["add", chunk_id, signature, partition])
+
+    def _add(self, chunk_id: str, signature: int, partition: str):
+        self._remove(chunk_id)
+        self.signatures[chunk_id] = signature
+        self.partitions[chunk_id] = partition
+        for key in self._band_keys(signature, partition):
+            self.bands.setdefault(key, []).append(chunk_id)
+
+    def _remove(self, chunk_id: str):
+        signature = self.signatures.pop(chunk_id, None)
+        if signature is None:
+            return
+        partition = self.partitions.pop(chunk_id)
+        for key in self._band_keys(signature, partition):
+            bucket = self.bands.get(key, [])
+            if chunk_id in bucket:
+                bucket.remove(chunk_id)
+            if not bucket:
+                self.bands.pop(key, None)
+
+    def find_duplicate(
+        self,
+        signature: int,
+        partition: str,
+        ignore: Optional[Set[str]] = None
+    ) -> Optional[str]:
+        """
+        Find an indexed chunk of the partition within the Hamming distance threshold
+
+        With 4 bands of 16 bits, any fingerprint within distance 3 shares at
+        least one band exactly, so only matching buckets need to be checked.
+        """
+        for key in self._band_keys(signature, partition):
+            for chunk_id in self.bands.get(key, []):
+                if ignore and chunk_id in ignore:
+                    continue
+                if bin(self.signatures[chunk_id] ^ signature).count("1") <= self.max_distance:
+                    return chunk_id
+        return None
+
+    def filter_duplicates(
+        self,
+        ids: List[str],
+        signatures: List[int],
+        partition: str,
+        ignore: Optional[Set[str]] = None
+    ) -> Tuple[List[int], Dict[str, str]]:
+        """
+        Split chunks into new ones and near-duplicates of indexed chunks
+
+        New chunks are reserved in the index immediately so concurrent
+        uploads carrying the same boilerplate do not both embed it. Call
+        release() for chunks that end up not being stored.
+
+        Args:
+            ids: Chunk ids
+            signatures: SimHash fingerprints aligned with ids
+            partition: Partition of the chunks; only its chunks are originals
+            ignore: Indexed chunk ids that do not count as originals, such as
+                chunks about to be deleted
+
+        Returns:
+            Tuple of (indexes of chunks to keep, map of chunk id to the id it duplicates)
+        """
+        keep = []
+        duplicates = {}
+        for i, (chunk_id, signature) in enumerate(zip(ids, signatures)):
+            if not settings.dedup_enabled:
+                keep.append(i)
+                continue
+            existing = self.find_duplicate(signature, partition, ignore)
+            if existing is not None and existing != chunk_id:
+                duplicates[chunk_id] = existing
+            else:
+                self._index(chunk_id, signature, partition)
+                keep.append(i)
+        return keep, duplicates
+
+    def inherit(self, chunk_id: str, original_id: str):
+        """Index a chunk under the fingerprint of the original it stood in for"""
+        if original_id in self.signatures:
+            self._index(chunk_id, self.signatures[original_id], self.partitions[original_id])
+
+    def repartition(self, ids: List[str], partition: str):
+        """Move indexed chunks to another partition"""
+        for chunk_id in ids:
+            if chunk_id in self.signatures:
+                self._index(chunk_id, self.signatures[chunk_id], partition)
+
+    def release(self, ids: List[str]):
+        """Remove chunks from the index"""
+        for chunk_id in ids:
+            if chunk_id in self.signatures:
+                self._remove(chunk_id)
+                self.journal.record(["delete", chunk_id])
+
+    async def persist(self):
+        """Write the changes since the last persist to disk without blocking the event loop"""
+        try:
+            await self.journal.persist(self._snapshot, len(self.signatures))
+        except Exception as e:
+            logger.error(f"Error saving dedup index: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get index statistics"""
+        return {
+            "indexed_chunks": len(self.signatures),
+            "buckets": len(self.bands)
+        }
+
+# Global instance
+dedup_service = DedupService()
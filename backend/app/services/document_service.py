@@ -0,0 +1,245 @@
+"""
+Document Service - Text extraction and chunking for uploaded files
+"""
+import asyncio
+import codecs
+import hashlib
+import logging
+import os
+import tarfile
+import uuid
+import zipfile
+from typing import List, Dict, Any, Union, Iterable, Iterator, BinaryIO
+
+import aiofiles
+
+from app.core.config import settings
+from app.services.cpu_pool import cpu_pool
+from app.services.text_processing import (
+    count_pdf_pages,
+    extract_pdf_pages,
+    extract_docx_blocks,
+    StreamChunker,
+    chunk_window
+)
+
+logger = logging.getLogger(__name__)
+
+TEXT_TYPES = {".txt", ".md", ".markdown"}
+SUPPORTED_TYPES = {".pdf", ".docx"} | TEXT_TYPES
+
+class DocumentService:
+    def _copy_entry(self, name: str, source: BinaryIO, dest_dir: str, max_size: int) -> Dict[str, Any]:
+        """
+        Copy one archive entry to dest_dir, hashing it on the way
+
+        Stops as soon as more than max_size bytes have been decompressed, so
+        entries that declare a small size but expand hugely are cut short.
+        file_size is the number of bytes read, also for failed entries.
+        """
+        file_type = os.path.splitext(name)[1].lower()
+        file_path = os.path.join(dest_dir, f"{uuid.uuid4()}{file_type}")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(file_path, "wb") as dest:
+                for block in iter(lambda: source.read(min(settings.upload_chunk_size, max_size + 1 - size)), b""):
+                    size += len(block)
+                    if size > max_size:
+                        raise ValueError(f"Uncompressed size exceeds {max_size} bytes")
+                    digest.update(block)
+                    dest.write(block)
+        except Exception as e:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return {"filename": name, "error": str(e), "file_size": size}
+
+        return {
+            "filename": name,
+            "file_path": file_path,
+            "file_type": file_type,
+            "file_size": size,
+            "content_hash": digest.hexdigest()
+        }
+
+    def iter_archive_entries(self, archive_path: str, dest_dir: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the files of a zip or tar archive one at a time
+
+        Each supported file is copied to dest_dir only when it is reached, so
+        the archive is never extracted as a whole. Tar archives, compressed
+        or not, are read as a stream. Entries that cannot be ingested are
+        yielded with an error instead of a file path.
+
+        Each file may expand to settings.max_file_size bytes, and reading
+        stops with a ValueError once the archive as a whole has expanded to
+        settings.max_archive_size bytes.
+        """
+        os.makedirs(dest_dir, exist_ok=True)
+        extracted = 0
+
+        def entry(name: str, open_source) -> Dict[str, Any]:
+            nonlocal extracted
+            file_type = os.path.splitext(name)[1].lower()
+            if file_type not in SUPPORTED_TYPES:
+                return {"filename": name, "error": f"Unsupported file type: {file_type or 'unknown'}"}
+            if extracted >= settings.max_archive_size:
+                raise ValueError(f"Archive expands beyond {settings.max_archive_size} bytes")
+            with open_source() as source:
+                result = self._copy_entry(
+                    name, source, dest_dir,
+                    min(settings.max_file_size, settings.max_archive_size - extracted)
+                )
+            # Rejected entries count too; their bytes were still decompressed
+            extracted += result.get("file_size", 0)
+            return result
+
+        def skipped(name: str) -> bool:
+            # Resource forks and other metadata files added by archivers
+            return name.startswith("__MACOSX/") or os.path.basename(name).startswith(".")
+
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or skipped(info.filename):
+                        continue
+                    yield entry(info.filename, lambda: archive.open(info))
+        else:
+            with tarfile.open(archive_path, mode="r|*") as archive:
+                for member in archive:
+                    if not member.isfile() or skipped(member.name):
+                        continue
+                    yield entry(member.name, lambda: archive.extractfile(member))
+
+    async def _extract_pdf(self, file_path: str) -> List[str]:
+        """Extract PDF pages in parallel page ranges across the process pool"""
+        page_count = await cpu_pool.run(count_pdf_pages, file_path)
+        step = max(1, settings.pdf_pages_per_task)
+        ranges = await asyncio.gather(*(
+            cpu_pool.run(extract_pdf_pages, file_path, start, start + step)
+            for start in range(0, page_count, step)
+        ))
+        return [page for pages in ranges for page in pages]
+
+    async def _extract_docx(self, file_path: str) -> List[str]:
+        """Extract DOCX paragraphs and tables in the process pool"""
+        blocks = await cpu_pool.run(extract_docx_blocks, file_path)
+        return ["\n".join(blocks)]
+
+    async def _extract_text_file(self, file_path: str) -> List[str]:
+        """Read a text file as decoded blocks without one large read"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        pieces = []
+        async with aiofiles.open(file_path, "rb") as f:
+            while True:
+                block = await f.read(settings.upload_chunk_size)
+                if not block:
+                    break
+                pieces.append(decoder.decode(block))
+        pieces.append(decoder.decode(b"", final=True))
+        return [piece for piece in pieces if piece]
+
+    async def process_document(self, file_path: str) -> Dict[str, Any]:
+        """
+        Extract text from a PDF, DOCX, TXT or Markdown file
+
+        Text is returned as a list of pieces (one per PDF page, one per text
+        file block) rather than one joined string; chunk_document feeds them
+        to the process pool a window at a time.
+
+        Args:
+            file_path: Path of the stored file
+
+        Returns:
+            Dict with the extracted pieces and file metadata
+        """
+        try:
+            file_type = os.path.splitext(file_path)[1].lower()
+            if file_type not in SUPPORTED_TYPES:
+                return {
+                    "success": False,
+                    "error": f"Unsupported file type: {file_type or 'unknown'}"
+                }
+
+            if file_type == ".pdf":
+                extraction = self._extract_pdf(file_path)
+            elif file_type == ".docx":
+                extraction = self._extract_docx(file_path)
+            else:
+                extraction = self._extract_text_file(file_path)
+
+            pages = await extraction
+
+            if not any(page.strip() for page in pages):
+                return {
+                    "success": False,
+                    "error": "No text could be extracted from the document"
+                }
+
+            logger.info(f"Extracted {len(pages)} pages from {file_path}")
+
+            return {
+                "success": True,
+                "content": pages,
+                "metadata": {
+                    "file_type": file_type,
+                    "file_size": os.path.getsize(file_path),
+                    "pages": len(pages) if file_type == ".pdf" else None,
+                    "char_count": sum(len(page) for page in pages)
+                }
+            }
+
+        except Exception as e:
+            logger.error(f"Error processing document {file_path}: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    async def chunk_document(
+        self,
+        content: Union[str, Iterable[str]],
+        chunk_size: int = 1000,
+        overlap: int = 200
+    ) -> List[Dict[str, Any]]:
+        """
+        Split extracted text into overlapping chunks
+
+        Args:
+            content: Text, or text pieces as returned by process_document
+            chunk_size: Maximum characters per chunk
+            overlap: Characters shared between consecutive chunks
+
+        Returns:
+            List of dicts with chunk text and position
+        """
+        window_size = settings.chunk_window_size
+        pieces = content
+        if isinstance(content, str):
+            pieces = (content[start:start + window_size] for start in range(0, len(content), window_size))
+
+        # Each process pool task gets one window of text and the chunker state
+        # left by the previous one, so no task receives the whole document
+        chunker = StreamChunker(chunk_size, overlap)
+        texts = []
+        window: List[str] = []
+        window_chars = 0
+        for piece in pieces:
+            window.append(piece)
+            window_chars += len(piece)
+            if window_chars >= window_size:
+                chunker, chunks = await cpu_pool.run(chunk_window, chunker, window, False)
+                texts.extend(chunks)
+                window = []
+                window_chars = 0
+        chunker, chunks = await cpu_pool.run(chunk_window, chunker, window, True)
+        texts.extend(chunks)
+
+        # Whitespace-only chunks carry nothing worth embedding
+        return [
+            {"text": text, "chunk_index": index}
+            for index, text in enumerate(text for text in texts if text.strip())
+        ]
+
+# Global instance
+document_service = DocumentService()
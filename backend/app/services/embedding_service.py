@@ -1,22 +1,84 @@
 import openai
 from app.core.config import settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
 import asyncio
 import aiohttp
+from app.services.text_processing import chunk_text
 
 class EmbeddingService:
     def __init__(self):
         openai.api_key = settings.openai_api_key
         self.model = "text-embedding-3-small"
+        self.dimension = 1536
+        self.provider = self._configured_provider()
+        # LRU cache of query text -> embedding so repeated queries are embedded once
+        self._cache: OrderedDict = OrderedDict()
+        # Shared by all callers so concurrent ingestions cannot flood the provider
+        self._semaphore = asyncio.Semaphore(settings.embedding_concurrency)
 
-    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts"""
-        try:
+    def _configured_provider(self) -> str:
+        """Resolve the configured provider; "auto" prefers OpenAI when a key is set"""
+        if settings.embedding_provider == "auto":
+            return "openai" if settings.openai_api_key else "chroma"
+        return settings.embedding_provider
+
+    @property
+    def available(self) -> bool:
+        """Whether texts are embedded here rather than by the vector store"""
+        return self.provider == "openai"
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one request's worth of texts"""
+        async with self._semaphore:
             response = await openai.Embedding.acreate(
                 model=self.model,
                 input=texts
             )
-            return [embedding["embedding"] for embedding in response["data"]]
+        return [embedding["embedding"] for embedding in response["data"]]
+
+    async def generate_embeddings(self, texts: List[str], cache: bool = True) -> List[List[float]]:
+        """
+        Generate embeddings for a list of texts, embedding only uncached ones
+
+        Args:
+            texts: Texts to embed
+            cache: Use the query cache; pass False for document text, which
+                is embedded once and would only evict queries
+        """
+        try:
+            embeddings: List[Optional[List[float]]] = []
+            missing = []
+            for text in texts:
+                cached = self._cache.get(text) if cache else None
+                if cached is not None:
+                    self._cache.move_to_end(text)
+                else:
+                    missing.append(text)
+                embeddings.append(cached)
+            
+            if missing:
+                unique_missing = list(dict.fromkeys(missing))
+                batch_size = settings.embedding_batch_size
+                batches = await asyncio.gather(*(
+                    self._embed_batch(unique_missing[start:start + batch_size])
+                    for start in range(0, len(unique_missing), batch_size)
+                ))
+                generated = dict(zip(
+                    unique_missing,
+                    [embedding for batch in batches for embedding in batch]
+                ))
+                embeddings = [
+                    embedding if embedding is not None else generated[text]
+                    for text, embedding in zip(texts, embeddings)
+                ]
+                
+                if cache and settings.embedding_cache_size > 0:
+                    self._cache.update(generated)
+                    while len(self._cache) > settings.embedding_cache_size:
+                        self._cache.popitem(last=False)
+            
+            return embeddings
         except Exception as e:
             print(f"Error generating embeddings: {e}")
             return []
@@ -28,55 +90,7 @@ class EmbeddingService:
 
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
         """Split text into overlapping chunks"""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                break_point = max(last_period, last_newline)
-                
-                if break_point > start + chunk_size // 2:  # Only break if it's not too short
-                    chunk = chunk[:break_point + 1]
-                    end = start + break_point + 1
-            
-            chunks.append(chunk.strip())
-            start = end - overlap
-            
-            if start >= len(text):
-                break
-        
-        return chunks
-
-    async def process_document_for_embeddings(self, content: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Process a document and return chunks with embeddings"""
-        chunks = self.chunk_text(content)
-        embeddings = await self.generate_embeddings(chunks)
-        
-        processed_chunks = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            processed_chunks.append({
-                "text": chunk,
-                "embedding": embedding,
-                "metadata": {
-                    **metadata,
-                    "chunk_index": i,
-                    "total_chunks": len(chunks)
-                }
-            })
-        
-        return processed_chunks
-
-
-
-
-
+        return chunk_text(text, chunk_size, overlap)
 
+# Global instance
+embedding_service = EmbeddingService()
@@ -0,0 +1,112 @@
+"""
+Index Journal - Incremental persistence for the in-memory local indexes
+
+An index is stored as a snapshot file plus an append-only log of the
+changes made since the snapshot was written, so persisting after an
+upsert costs the size of the change rather than the size of the corpus.
+The log is folded into a fresh snapshot once it holds more entries than
+the index itself.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Small indexes are not worth rewriting for every handful of changes
+COMPACT_MIN_ENTRIES = 1000
+
+class IndexJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.generation = 0
+        self.logged = 0
+        self.pending: List[List[Any]] = []
+        self._lock = asyncio.Lock()
+
+    def load(self) -> Tuple[Dict[str, Any], List[List[Any]]]:
+        """
+        Read the snapshot and the changes logged after it
+
+        Log lines from an older generation were already folded into the
+        snapshot by a compaction that stopped before truncating the log, and
+        a torn last line is what an interrupted append leaves behind; both
+        are skipped.
+
+        Returns:
+            Tuple of (snapshot entries, changes to replay in order)
+        """
+        entries: Dict[str, Any] = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                stored = json.load(f)
+            self.generation = stored["generation"]
+            entries = stored["entries"]
+
+        changes = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r") as f:
+                for line in f:
+                    try:
+                        generation, change = json.loads(line)
+                    except ValueError:
+                        break
+                    if generation == self.generation:
+                        changes.append(change)
+        self.logged = len(changes)
+        return entries, changes
+
+    def record(self, change: List[Any]):
+        """Queue a change for the next persist()"""
+        self.pending.append(change)
+
+    def _append(self, generation: int, changes: List[List[Any]]):
+        """Append changes to the log"""
+        self._ensure_directory()
+        with open(self.log_path, "a") as f:
+            f.write("".join(json.dumps([generation, change]) + "\n" for change in changes))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self, generation: int, entries: Dict[str, Any]):
+        """Atomically write a snapshot, then drop the log it supersedes"""
+        self._ensure_directory()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"generation": generation, "entries": entries}, f)
+        os.replace(tmp_path, self.path)
+        self.generation = generation
+        self.logged = 0
+        with open(self.log_path, "w"):
+            pass
+
+    def _ensure_directory(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    async def persist(self, snapshot: Callable[[], Dict[str, Any]], size: int):
+        """
+        Write queued changes to disk without blocking the event loop
+
+        Args:
+            snapshot: Builds the full index entries; only called when compacting
+            size: Number of entries in the index
+        """
+        async with self._lock:
+            if not self.pending:
+                return
+            changes, self.pending = self.pending, []
+            try:
+                if self.logged + len(changes) > max(size, COMPACT_MIN_ENTRIES):
+                    await asyncio.to_thread(self._compact, self.generation + 1, snapshot())
+                else:
+                    await asyncio.to_thread(self._append, self.generation, changes)
+                    self.logged += len(changes)
+            except Exception:
+                # Keep the changes for the next attempt
+                self.pending = changes + self.pending
+                raise
@@ -0,0 +1,120 @@
+"""
+Index Maintenance Service - Purges orphaned vectors and compacts the vector index
+"""
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.database.connection import SessionLocal
+from app.database.models import Document, DocumentChunk
+from app.services.chroma_service import chroma_service, SNAPSHOT_SOURCE_KEY
+from app.services.ingestion_pipeline import ingestion_pipeline
+
+logger = logging.getLogger(__name__)
+
+class IndexMaintenanceService:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def _find_orphans_in_page(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> List[str]:
+        """
+        Check one page of stored chunks against the chunk ownership registry
+
+        A chunk is orphaned when its document no longer exists, or when its
+        document has registered chunks and this chunk is not one of them.
+        Documents ingested before the registry existed have no registered
+        chunks and are left alone, as are chunks imported from a snapshot,
+        whose documents live on the node that exported them.
+        """
+        owners = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            if (metadata or {}).get(SNAPSHOT_SOURCE_KEY):
+                continue
+            try:
+                owners[chunk_id] = int((metadata or {})["document_id"])
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not owners:
+            return []
+
+        db = SessionLocal()
+        try:
+            live_documents = {
+                row[0] for row in db.query(Document.id).filter(Document.id.in_(set(owners.values())))
+            }
+            registered = {
+                row[0]: row[1]
+                for row in db.query(DocumentChunk.id, DocumentChunk.document_id).filter(
+                    DocumentChunk.document_id.in_(live_documents)
+                )
+            }
+        finally:
+            db.close()
+
+        tracked_documents = set(registered.values())
+        return [
+            chunk_id for chunk_id, document_id in owners.items()
+            if document_id not in live_documents
+            or (document_id in tracked_documents and chunk_id not in registered)
+        ]
+
+    async def find_orphaned_chunks(self) -> List[str]:
+        """Scan the vector store for chunks no live document owns"""
+        orphans = []
+        async for ids, metadatas in chroma_service.iter_metadata():
+            page_orphans = await asyncio.to_thread(self._find_orphans_in_page, ids, metadatas)
+            # Checked after the registry lookup: a chunk is either registered by
+            # then or its sync is still in flight
+            pending = ingestion_pipeline.pending_chunk_ids()
+            orphans.extend(chunk_id for chunk_id in page_orphans if chunk_id not in pending)
+        return orphans
+
+    async def run_compaction(self) -> Dict[str, Any]:
+        """Purge orphaned vectors, then compact the index"""
+        try:
+            orphans = await self.find_orphaned_chunks()
+            if orphans:
+                delete_result = await chroma_service.delete_documents(orphans)
+                if not delete_result["success"]:
+                    raise Exception(delete_result["error"])
+
+            compaction = await chroma_service.compact()
+
+            logger.info(f"Index maintenance purged {len(orphans)} orphaned chunks")
+
+            return {
+                "success": True,
+                "orphans_purged": len(orphans),
+                "compaction": compaction
+            }
+
+        except Exception as e:
+            logger.error(f"Error during index maintenance: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    async def _run_periodically(self):
+        while True:
+            await asyncio.sleep(settings.index_compaction_interval)
+            await self.run_compaction()
+
+    def start(self):
+        """Start the background compaction job"""
+        if settings.index_compaction_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run_periodically())
+
+    async def stop(self):
+        """Stop the background compaction job"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global instance
+index_maintenance_service = IndexMaintenanceService()
@@ -0,0 +1,1079 @@
+"""
+Ingestion Pipeline - Staged background processing of uploaded documents
+
+Uploads are queued as jobs and flow through extract -> chunk -> embed -> index.
+Each stage has its own worker pool and a bounded queue in front of it, so
+stages overlap across documents and a slow stage applies backpressure all
+the way back to the upload endpoint. Archives and multi-file uploads are
+tracked as batches of such jobs.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.database.connection import SessionLocal
+from app.database.models import Document, DocumentChunk, DocumentWorkflow
+from app.services.blob_service import blob_service
+from app.services.chroma_service import chroma_service
+from app.services.cpu_pool import cpu_pool
+from app.services.dedup_service import dedup_service
+from app.services.document_service import document_service
+from app.services.embedding_service import embedding_service
+from app.services.text_processing import compute_content_hash, simhash_chunks
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("extract", "chunk", "embed", "index")
+
+# Chunk ids per registry query, below SQLite's bound parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+class IngestionPipeline:
+    def __init__(self):
+        self.jobs: OrderedDict = OrderedDict()
+        self.batches: OrderedDict = OrderedDict()
+        self._batch_tasks: set = set()
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: List[asyncio.Task] = []
+        # Chunk ids whose vectors are being written but not yet registered
+        self._pending_chunks: set = set()
+        # Unfinished job per document, so duplicate uploads can follow it
+        self._document_jobs: Dict[int, str] = {}
+
+    # ------------------------------------------------------------------
+    # Chunk registry sync
+    # ------------------------------------------------------------------
+
+    def _plan_chunk_sync(self, document_id: int, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Diff a document's chunks against the registry
+
+        Chunk IDs are derived from the owning document and the chunk text, so
+        unchanged chunks keep their IDs across re-uploads. Nothing is written
+        here; the registry changes are committed by _commit_chunk_sync once
+        the vector store has been updated.
+
+        Returns:
+            Dict with the chunks to add, the ids to remove and vector metadata
+        """
+        desired = {}
+        occurrences = {}
+        for chunk in chunks:
+            chunk_id = chroma_service.make_chunk_id(chunk["text"], {"document_id": document_id})
+            occurrence = occurrences.get(chunk_id, 0)
+            occurrences[chunk_id] = occurrence + 1
+            if occurrence:
+                # Repeated text within one document gets an ordinal suffix
+                chunk_id = f"{chunk_id}_{occurrence}"
+            desired[chunk_id] = chunk
+
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if not document:
+                raise ValueError(f"Document {document_id} not found")
+
+            existing = {row[0] for row in db.query(DocumentChunk.id).filter(DocumentChunk.document_id == document_id)}
+            added = [chunk_id for chunk_id in desired if chunk_id not in existing]
+            removed = [chunk_id for chunk_id in existing if chunk_id not in desired]
+
+            partition = {"workflow_id": document.workflow_id} if document.workflow_id is not None else {}
+            return {
+                "document_id": document_id,
+                "partition": "" if document.workflow_id is None else str(document.workflow_id),
+                "positions": {chunk_id: chunk["chunk_index"] for chunk_id, chunk in desired.items()},
+                "ids": added,
+                "texts": [desired[chunk_id]["text"] for chunk_id in added],
+                "metadatas": [
+                    {
+                        **partition,
+                        "chunk_index": desired[chunk_id]["chunk_index"],
+                        "total_chunks": len(chunks),
+                        "document_id": str(document_id),
+                        "filename": document.filename
+                    }
+                    for chunk_id in added
+                ],
+                "removed": removed,
+                "unchanged": len(desired) - len(added)
+            }
+        finally:
+            db.close()
+
+    async def _skip_near_duplicates(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Drop added chunks that nearly duplicate an already indexed chunk
+
+        Only chunks of the same workflow partition count as originals, so a
+        workflow-filtered search still finds the content. Skipped chunks are
+        registered with a link to their original (duplicate_of) instead of a
+        vector of their own; see detach_duplicates.
+
+        Kept chunks are reserved in the dedup index; they are released again
+        if their vectors are never stored. Chunks this sync removes do not
+        count as originals, so an edited chunk is never skipped in favour of
+        its own previous version.
+        """
+        plan["duplicates"] = {}
+        if not plan["ids"]:
+            return plan
+
+        signatures = await cpu_pool.run(simhash_chunks, plan["texts"])
+        keep, duplicates = dedup_service.filter_duplicates(
+            plan["ids"], signatures, plan["partition"], set(plan["removed"])
+        )
+        plan["duplicates"] = {
+            chunk_id: {"duplicate_of": duplicates[chunk_id], "content_hash": compute_content_hash(text)}
+            for chunk_id, text in zip(plan["ids"], plan["texts"])
+            if chunk_id in duplicates
+        }
+        for key in ("ids", "texts", "metadatas"):
+            plan[key] = [plan[key][i] for i in keep]
+        return plan
+
+    def _commit_chunk_sync(self, plan: Dict[str, Any], document_updates: Optional[Dict[str, Any]] = None):
+        """Record a sync plan in the registry, with any document changes, in one transaction"""
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.id == plan["document_id"]).first()
+            if not document:
+                raise ValueError(f"Document {plan['document_id']} not found")
+
+            existing = {chunk.id: chunk for chunk in document.chunks}
+            for chunk_id in plan["removed"]:
+                if chunk_id in existing:
+                    db.delete(existing.pop(chunk_id))
+            for chunk_id, text in zip(plan["ids"], plan["texts"]):
+                if chunk_id not in existing:
+                    db.add(DocumentChunk(
+                        id=chunk_id,
+                        document_id=document.id,
+                        chunk_index=plan["positions"][chunk_id],
+                        content_hash=compute_content_hash(text)
+                    ))
+            for chunk_id, duplicate in plan["duplicates"].items():
+                if chunk_id not in existing:
+                    db.add(DocumentChunk(
+                        id=chunk_id,
+                        document_id=document.id,
+                        chunk_index=plan["positions"][chunk_id],
+                        content_hash=duplicate["content_hash"],
+                        duplicate_of=duplicate["duplicate_of"]
+                    ))
+            for chunk_id, chunk in existing.items():
+                if chunk_id in plan["positions"]:
+                    chunk.chunk_index = plan["positions"][chunk_id]
+            for field, value in (document_updates or {}).items():
+                setattr(document, field, value)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _apply_chunk_sync(
+        self,
+        plan: Dict[str, Any],
+        embeddings: Optional[List[List[float]]] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Upsert added chunks and delete removed ones from the vector store
+
+        Chunks of other documents that stand in for removed ones get their
+        own vectors first. If any write fails the added vectors are deleted
+        again, so the document is left with the chunks its registry still lists.
+        """
+        success = True
+        error = None
+        if plan["ids"]:
+            chroma_result = await chroma_service.upsert_documents(
+                documents=plan["texts"],
+                metadatas=plan["metadatas"],
+                ids=plan["ids"],
+                embeddings=embeddings,
+                on_progress=on_progress
+            )
+            success = chroma_result["success"]
+            error = chroma_result.get("error")
+        if success and plan["removed"]:
+            chroma_result = await self.detach_duplicates(plan["removed"])
+            success = chroma_result["success"]
+            error = chroma_result.get("error")
+        if success and plan["removed"]:
+            chroma_result = await chroma_service.delete_documents(plan["removed"])
+            success = chroma_result["success"]
+            error = chroma_result.get("error")
+        if not success and plan["ids"]:
+            await chroma_service.delete_documents(plan["ids"])
+
+        if not success:
+            return {
+                "success": False,
+                "error": error or "Vector store update failed",
+                "chunks_added": 0,
+                "chunks_removed": 0,
+                "chunks_unchanged": plan["unchanged"],
+                "duplicates_skipped": 0
+            }
+
+        return {
+            "success": True,
+            "chunks_added": len(plan["ids"]),
+            "chunks_removed": len(plan["removed"]),
+            "chunks_unchanged": plan["unchanged"],
+            "duplicates_skipped": len(plan["duplicates"])
+        }
+
+    async def _store_chunk_sync(
+        self,
+        plan: Dict[str, Any],
+        embeddings: Optional[List[List[float]]] = None,
+        document_updates: Optional[Dict[str, Any]] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Write a sync plan's vectors, then commit its registry changes
+
+        The registry and document updates are only committed when every
+        vector write succeeded. Until then the new chunk ids are reported by
+        pending_chunk_ids() so compaction does not purge them as orphans.
+        """
+        self._pending_chunks.update(plan["ids"])
+        try:
+            result = await self._apply_chunk_sync(plan, embeddings, on_progress)
+            if result["success"]:
+                await asyncio.to_thread(self._commit_chunk_sync, plan, document_updates)
+                await dedup_service.persist()
+                if plan["duplicates"] and await asyncio.to_thread(self._has_workflow_links, plan["document_id"]):
+                    # Linked workflows filter by document id, which the originals do not carry
+                    await self.detach_document_duplicates(plan["document_id"])
+            return result
+        finally:
+            self._pending_chunks.difference_update(plan["ids"])
+
+    # ------------------------------------------------------------------
+    # Near-duplicate links
+    # ------------------------------------------------------------------
+
+    def _has_workflow_links(self, document_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            return db.query(DocumentWorkflow.document_id).filter(
+                DocumentWorkflow.document_id == document_id
+            ).first() is not None
+        finally:
+            db.close()
+
+    def _find_duplicates(
+        self,
+        chunk_ids: Optional[List[str]] = None,
+        document_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Registry chunks standing in for any of chunk_ids, or all of a document's
+
+        Returns each chunk's id, its original and the vector metadata it
+        gets once it is stored under its own id.
+        """
+        db = SessionLocal()
+        try:
+            rows = []
+            if chunk_ids is not None:
+                for start in range(0, len(chunk_ids), LOOKUP_BATCH_SIZE):
+                    batch = chunk_ids[start:start + LOOKUP_BATCH_SIZE]
+                    rows.extend(
+                        db.query(DocumentChunk, Document)
+                        .join(Document, DocumentChunk.document_id == Document.id)
+                        .filter(DocumentChunk.duplicate_of.in_(batch))
+                        .all()
+                    )
+                # Chunks removed together with their original need no vector
+                removed = set(chunk_ids)
+                rows = [(chunk, document) for chunk, document in rows if chunk.id not in removed]
+            else:
+                rows = (
+                    db.query(DocumentChunk, Document)
+                    .join(Document, DocumentChunk.document_id == Document.id)
+                    .filter(DocumentChunk.document_id == document_id, DocumentChunk.duplicate_of.isnot(None))
+                    .all()
+                )
+            if not rows:
+                return []
+
+            totals = dict(
+                db.query(DocumentChunk.document_id, func.count(DocumentChunk.id))
+                .filter(DocumentChunk.document_id.in_({document.id for _, document in rows}))
+                .group_by(DocumentChunk.document_id)
+                .all()
+            )
+            return [
+                {
+                    "id": chunk.id,
+                    "duplicate_of": chunk.duplicate_of,
+                    "metadata": {
+                        **({"workflow_id": document.workflow_id} if document.workflow_id is not None else {}),
+                        "chunk_index": chunk.chunk_index,
+                        "total_chunks": totals[document.id],
+                        "document_id": str(document.id),
+                        "filename": document.filename
+                    }
+                }
+                for chunk, document in rows
+            ]
+        finally:
+            db.close()
+
+    def _clear_duplicate_links(self, chunk_ids: List[str]):
+        db = SessionLocal()
+        try:
+            for start in range(0, len(chunk_ids), LOOKUP_BATCH_SIZE):
+                db.query(DocumentChunk).filter(
+                    DocumentChunk.id.in_(chunk_ids[start:start + LOOKUP_BATCH_SIZE])
+                ).update({DocumentChunk.duplicate_of: None}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _store_duplicates(self, duplicates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Give near-duplicate chunks vectors of their own
+
+        The original's text and embedding are copied under the duplicate's id
+        and metadata; the texts differ by at most a few SimHash bits, so no
+        re-embedding is needed. The link is cleared once the copy is stored.
+        """
+        if not duplicates:
+            return {"success": True, "chunks_detached": 0}
+
+        fetched = await chroma_service.get_vectors(sorted({duplicate["duplicate_of"] for duplicate in duplicates}))
+        if not fetched["success"]:
+            return fetched
+        records = fetched["records"]
+
+        found = [duplicate for duplicate in duplicates if duplicate["duplicate_of"] in records]
+        if len(found) < len(duplicates):
+            logger.warning(f"{len(duplicates) - len(found)} near-duplicate chunks have no stored original")
+        if found:
+            result = await chroma_service.upsert_documents(
+                documents=[records[duplicate["duplicate_of"]]["document"] for duplicate in found],
+                metadatas=[duplicate["metadata"] for duplicate in found],
+                ids=[duplicate["id"] for duplicate in found],
+                embeddings=[records[duplicate["duplicate_of"]]["embedding"] for duplicate in found]
+            )
+            if not result["success"]:
+                return result
+
+        await asyncio.to_thread(self._clear_duplicate_links, [duplicate["id"] for duplicate in found])
+        for duplicate in found:
+            dedup_service.inherit(duplicate["id"], duplicate["duplicate_of"])
+        await dedup_service.persist()
+        return {"success": True, "chunks_detached": len(found)}
+
+    async def detach_duplicates(self, chunk_ids: List[str]) -> Dict[str, Any]:
+        """
+        Store own vectors for chunks that stand in for chunk_ids
+
+        Call before deleting chunks from the vector store, so near-duplicates
+        of other documents do not disappear with their original.
+        """
+        if not chunk_ids:
+            return {"success": True, "chunks_detached": 0}
+        duplicates = await asyncio.to_thread(self._find_duplicates, chunk_ids=list(chunk_ids))
+        return await self._store_duplicates(duplicates)
+
+    async def detach_document_duplicates(self, document_id: int) -> Dict[str, Any]:
+        """
+        Store own vectors for all of a document's near-duplicate chunks
+
+        Needed once the document is linked into another workflow, whose
+        search filter matches it by document id.
+        """
+        duplicates = await asyncio.to_thread(self._find_duplicates, document_id=document_id)
+        return await self._store_duplicates(duplicates)
+
+    # ------------------------------------------------------------------
+    # Ownership
+    # ------------------------------------------------------------------
+
+    def _stored_chunk_ids(self, document_id: int) -> List[str]:
+        """Registry chunks of a document that have vectors of their own"""
+        db = SessionLocal()
+        try:
+            return [
+                row[0] for row in db.query(DocumentChunk.id).filter(
+                    DocumentChunk.document_id == document_id,
+                    DocumentChunk.duplicate_of.is_(None)
+                )
+            ]
+        finally:
+            db.close()
+
+    def _transfer_ownership(self, document_id: int, workflow_id: int):
+        """Make a linked workflow the document's owner; its link becomes redundant"""
+        db = SessionLocal()
+        try:
+            db.query(Document).filter(Document.id == document_id).update(
+                {Document.workflow_id: workflow_id}, synchronize_session=False
+            )
+            db.query(DocumentWorkflow).filter(
+                DocumentWorkflow.document_id == document_id,
+                DocumentWorkflow.workflow_id == workflow_id
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def transfer_document(self, document_id: int, workflow_id: int) -> Dict[str, Any]:
+        """
+        Hand a document over to another workflow it is linked into
+
+        The document's vectors are stored again under the new workflow_id and
+        its fingerprints move to the new dedup partition. Near-duplicates
+        that stood in for its chunks, or that its own chunks stood in for,
+        get vectors of their own first, since the old and new workflow no
+        longer share the originals.
+
+        Returns:
+            Dict with success and the number of chunks moved
+        """
+        detached = await self.detach_document_duplicates(document_id)
+        if not detached["success"]:
+            return detached
+
+        chunk_ids = await asyncio.to_thread(self._stored_chunk_ids, document_id)
+        if not chunk_ids:
+            # Documents ingested before chunk registration: find chunks by owner
+            async for ids, _ in chroma_service.iter_metadata(where={"document_id": str(document_id)}):
+                chunk_ids.extend(ids)
+
+        detached = await self.detach_duplicates(chunk_ids)
+        if not detached["success"]:
+            return detached
+
+        moved = []
+        if chunk_ids:
+            fetched = await chroma_service.get_vectors(chunk_ids)
+            if not fetched["success"]:
+                return fetched
+            records = fetched["records"]
+            moved = [chunk_id for chunk_id in chunk_ids if chunk_id in records]
+        if moved:
+            result = await chroma_service.upsert_documents(
+                documents=[records[chunk_id]["document"] for chunk_id in moved],
+                metadatas=[{**records[chunk_id]["metadata"], "workflow_id": workflow_id} for chunk_id in moved],
+                ids=moved,
+                embeddings=[records[chunk_id]["embedding"] for chunk_id in moved]
+            )
+            if not result["success"]:
+                return result
+            dedup_service.repartition(moved, str(workflow_id))
+            await dedup_service.persist()
+
+        await asyncio.to_thread(self._transfer_ownership, document_id, workflow_id)
+        return {"success": True, "chunks_moved": len(moved)}
+
+    def pending_chunk_ids(self) -> set:
+        """Chunk ids whose vectors may exist before they are registered"""
+        return set(self._pending_chunks)
+
+    async def sync_document_chunks(
+        self,
+        document_id: int,
+        chunks: List[Dict[str, Any]],
+        document_updates: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Bring a document's indexed chunks in line with its current chunks
+
+        Only new chunks are embedded and upserted; chunks that disappeared
+        are deleted. Vector metadata of unchanged chunks is left as is; the
+        registry holds their current position.
+
+        Args:
+            document_id: Document to sync
+            chunks: Chunks as returned by DocumentService.chunk_document
+            document_updates: Document fields to set in the same transaction
+                as the registry, only if the vector store update succeeds
+
+        Returns:
+            Dict with success and added, removed and unchanged chunk counts
+        """
+        plan = await asyncio.to_thread(self._plan_chunk_sync, document_id, chunks)
+        plan = await self._skip_near_duplicates(plan)
+        return await self._store_chunk_sync(plan, document_updates=document_updates)
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    async def _extract(self, job: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        result = await document_service.process_document(payload["file_path"])
+        if not result["success"]:
+            raise ValueError(result["error"])
+        payload["content"] = result["content"]
+        # Extracted text lives compressed in the blob store, not in the row
+        payload["blob"] = await blob_service.put_text(result["content"])
+        return payload
+
+    async def _chunk(self, job: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        chunks = await document_service.chunk_document(payload.pop("content"))
+        plan = await asyncio.to_thread(self._plan_chunk_sync, payload["document_id"], chunks)
+        payload["plan"] = await self._skip_near_duplicates(plan)
+        job["chunks_total"] = len(chunks)
+        return payload
+
+    async def _embed(self, job: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        texts = payload["plan"]["texts"]
+        payload["embeddings"] = None
+        # Without an embedding provider the vector store embeds the texts itself
+        if texts and embedding_service.available:
+            embeddings = await embedding_service.generate_embeddings(texts, cache=False)
+            if len(embeddings) != len(texts):
+                raise RuntimeError("Embedding service returned no vectors")
+            payload["embeddings"] = embeddings
+        return payload
+
+    async def _index(self, job: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        job["chunks_to_index"] = len(payload["plan"]["ids"])
+        job["chunks_indexed"] = 0
+
+        def record_progress(progress: Dict[str, Any]):
+            # Upserts go out in batches; report how far the stage has got
+            job["chunks_indexed"] = progress["documents_upserted"]
+            job["updated_at"] = datetime.utcnow().isoformat()
+
+        result = await self._store_chunk_sync(
+            payload["plan"],
+            payload.pop("embeddings"),
+            {
+                "content_ref": payload["blob"]["key"],
+                "content_size": payload["blob"]["size"],
+                "processed_at": datetime.utcnow()
+            },
+            on_progress=record_progress
+        )
+        if not result["success"]:
+            raise RuntimeError(result["error"])
+        # The document row now references the blob
+        blob_service.unpin(payload["blob"]["key"])
+        job["result"] = result
+        return payload
+
+    def _discard_document(self, document_id: int, file_path: str):
+        """Remove a new upload that could not be processed"""
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if document:
+                db.delete(document)
+                db.commit()
+        finally:
+            db.close()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    # ------------------------------------------------------------------
+    # Uploads
+    # ------------------------------------------------------------------
+
+    def _register_document(
+        self,
+        file_path: str,
+        filename: str,
+        file_type: str,
+        file_size: int,
+        content_hash: str,
+        workflow_id: Optional[int]
+    ) -> Dict[str, Any]:
+        """
+        Create the document row for an upload, or find the identical stored one
+
+        Identical content is stored once; an upload matching a stored document
+        links that document to the uploading workflow instead.
+        """
+        db = SessionLocal()
+        try:
+            existing = db.query(Document).filter(Document.content_hash == content_hash).first()
+            if not existing:
+                # processed_at is set by the index stage
+                document = Document(
+                    filename=filename,
+                    file_path=file_path,
+                    file_size=file_size,
+                    file_type=file_type,
+                    content_hash=content_hash,
+                    workflow_id=workflow_id
+                )
+                db.add(document)
+                try:
+                    db.commit()
+                    return {"document_id": document.id, "created": True}
+                except IntegrityError:
+                    # A concurrent upload of the same file won the unique index
+                    db.rollback()
+                    existing = db.query(Document).filter(Document.content_hash == content_hash).first()
+
+            linked = False
+            if workflow_id is not None and workflow_id != existing.workflow_id:
+                link = db.query(DocumentWorkflow).filter(
+                    DocumentWorkflow.document_id == existing.id,
+                    DocumentWorkflow.workflow_id == workflow_id
+                ).first()
+                if not link:
+                    db.add(DocumentWorkflow(document_id=existing.id, workflow_id=workflow_id))
+                    db.commit()
+                    linked = True
+
+            return {
+                "document_id": existing.id,
+                "created": False,
+                "filename": existing.filename,
+                # Documents from before processed_at was recorded only have their text
+                "processed": existing.processed_at is not None or existing.content_ref is not None,
+                "linked_to_workflow": linked
+            }
+        finally:
+            db.close()
+
+    def _replace_file(self, document_id: int, file_path: str):
+        """Point a document at a new copy of its file and remove the old one"""
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if not document:
+                return
+            previous = document.file_path
+            document.file_path = file_path
+            db.commit()
+        finally:
+            db.close()
+        if previous != file_path and os.path.exists(previous):
+            os.remove(previous)
+
+    def _unprocessed_documents(self) -> List[Tuple[int, str, str]]:
+        """Documents whose ingestion never finished, as (id, file path, file name)"""
+        db = SessionLocal()
+        try:
+            return [
+                tuple(row) for row in db.query(Document.id, Document.file_path, Document.filename).filter(
+                    Document.processed_at.is_(None),
+                    Document.content_ref.is_(None)
+                ).order_by(Document.id)
+            ]
+        finally:
+            db.close()
+
+    async def _resume(self):
+        documents = await asyncio.to_thread(self._unprocessed_documents)
+        resumed = 0
+        for document_id, file_path, filename in documents:
+            if document_id in self._document_jobs:
+                continue
+            if not os.path.exists(file_path):
+                logger.warning(f"Upload of unprocessed document {document_id} is gone, removing the document")
+                await asyncio.to_thread(self._discard_document, document_id, file_path)
+                continue
+            await self.submit(document_id, file_path, filename)
+            resumed += 1
+        if resumed:
+            logger.info(f"Re-queued {resumed} documents left unprocessed by a previous run")
+
+    def resume(self):
+        """
+        Re-queue documents whose ingestion a previous run did not finish
+
+        Jobs only live in memory, so uploads queued or in flight when the
+        server stopped would otherwise stay unprocessed. Runs in the
+        background, since queueing waits while the pipeline is full.
+        """
+        self.start()
+        task = asyncio.create_task(self._resume())
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def ingest_upload(
+        self,
+        file_path: str,
+        filename: str,
+        file_size: int,
+        content_hash: str,
+        workflow_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Register a stored upload and queue it for processing
+
+        Args:
+            file_path: Path the upload was written to
+            filename: Original file name
+            file_size: Size in bytes
+            content_hash: SHA-256 of the file
+            workflow_id: Workflow the document belongs to
+
+        Returns:
+            Dict with the document id and either a job id or the duplicate it matched
+        """
+        file_type = os.path.splitext(filename)[1]
+        registered = await asyncio.to_thread(
+            self._register_document,
+            file_path, filename, file_type, file_size, content_hash, workflow_id
+        )
+
+        # An earlier upload of this file that no job is processing was cut
+        # short, e.g. by a restart; process the document from this upload
+        stalled = (
+            not registered["created"]
+            and not registered["processed"]
+            and registered["document_id"] not in self._document_jobs
+        )
+
+        if not registered["created"] and not stalled:
+            os.remove(file_path)
+            if registered["linked_to_workflow"]:
+                detached = await self.detach_document_duplicates(registered["document_id"])
+                if not detached["success"]:
+                    logger.error(
+                        f"Could not store near-duplicate chunks of linked document "
+                        f"{registered['document_id']}: {detached['error']}"
+                    )
+            logger.info(f"Upload matches existing document {registered['document_id']}, skipped processing")
+            # A document still being processed reports the job doing it
+            job_id = None if registered["processed"] else self._document_jobs.get(registered["document_id"])
+            return {
+                "success": True,
+                "document_id": registered["document_id"],
+                "job_id": job_id,
+                "filename": registered["filename"],
+                "file_size": file_size,
+                "status": "completed" if registered["processed"] else "processing",
+                "duplicate": True,
+                "linked_to_workflow": registered["linked_to_workflow"],
+                "message": "Identical document already exists; reused its chunks"
+            }
+
+        job = await self.submit(registered["document_id"], file_path, filename)
+        if stalled:
+            await asyncio.to_thread(self._replace_file, registered["document_id"], file_path)
+
+        logger.info(f"Uploaded document {registered['document_id']}, ingestion job {job['job_id']}")
+
+        return {
+            "success": True,
+            "document_id": registered["document_id"],
+            "job_id": job["job_id"],
+            "filename": filename,
+            "file_size": file_size,
+            "status": job["status"],
+            "message": "Document uploaded and queued for processing"
+        }
+
+    # ------------------------------------------------------------------
+    # Batches
+    # ------------------------------------------------------------------
+
+    def create_batch(self, name: str, workflow_id: Optional[int] = None) -> Dict[str, Any]:
+        """Start tracking a group of uploads"""
+        now = datetime.utcnow().isoformat()
+        batch = {
+            "batch_id": str(uuid.uuid4()),
+            "name": name,
+            "workflow_id": workflow_id,
+            "status": "reading",
+            "files": [],
+            "created_at": now,
+            "updated_at": now,
+            "error": None
+        }
+        self.batches[batch["batch_id"]] = batch
+
+        # Keep a bounded history of batches
+        while len(self.batches) > settings.ingestion_job_history:
+            self.batches.popitem(last=False)
+        return batch
+
+    async def add_to_batch(
+        self,
+        batch: Dict[str, Any],
+        entry: Dict[str, Any],
+        workflow_id: Optional[int] = None
+    ):
+        """
+        Ingest one extracted or uploaded file as part of a batch
+
+        Per-file failures are recorded on the batch rather than raised.
+        """
+        record = {"filename": entry["filename"], "status": "queued"}
+        batch["files"].append(record)
+        batch["updated_at"] = datetime.utcnow().isoformat()
+
+        if entry.get("error"):
+            record.update({"status": "failed", "error": entry["error"]})
+            return
+
+        try:
+            result = await self.ingest_upload(
+                entry["file_path"],
+                entry["filename"],
+                entry["file_size"],
+                entry["content_hash"],
+                workflow_id
+            )
+        except Exception as e:
+            logger.error(f"Error ingesting {entry['filename']} in batch {batch['batch_id']}: {e}")
+            if os.path.exists(entry["file_path"]):
+                os.remove(entry["file_path"])
+            record.update({"status": "failed", "error": str(e)})
+            return
+
+        record["document_id"] = result["document_id"]
+        job = self.jobs.get(result["job_id"]) if result["job_id"] else None
+        if job:
+            record["job_id"] = result["job_id"]
+            # Keep the live job so progress survives job history pruning
+            record["job"] = job
+        if result.get("duplicate"):
+            record["status"] = "duplicate"
+
+    async def _ingest_archive(self, batch: Dict[str, Any], archive_path: str, workflow_id: Optional[int]):
+        try:
+            entries = document_service.iter_archive_entries(archive_path, settings.upload_dir)
+            while True:
+                # Archive reads are blocking; step the reader in a thread
+                entry = await asyncio.to_thread(next, entries, None)
+                if entry is None:
+                    break
+                await self.add_to_batch(batch, entry, workflow_id)
+            batch["status"] = "processing"
+        except Exception as e:
+            logger.error(f"Error reading archive for batch {batch['batch_id']}: {e}")
+            batch["status"] = "failed"
+            batch["error"] = str(e)
+        finally:
+            batch["updated_at"] = datetime.utcnow().isoformat()
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+
+    def submit_archive(self, archive_path: str, name: str, workflow_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ingest every supported file of a zip or tar archive in the background
+
+        Entries are read one at a time and fed into the pipeline as they are
+        reached; the stage worker pools process them in parallel. The archive
+        file is removed once it has been read.
+
+        Returns:
+            The batch status
+        """
+        self.start()
+        batch = self.create_batch(name, workflow_id)
+        task = asyncio.create_task(self._ingest_archive(batch, archive_path, workflow_id))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+        return self.get_batch(batch["batch_id"])
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get a batch's per-file status and progress counts"""
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+
+        files = []
+        counts: Dict[str, int] = {}
+        for record in batch["files"]:
+            job = record.get("job")
+            status = job["status"] if job else record["status"]
+            counts[status] = counts.get(status, 0) + 1
+            files.append({
+                "filename": record["filename"],
+                "document_id": record.get("document_id"),
+                "job_id": record.get("job_id"),
+                "status": status,
+                "stage": job["stage"] if job else None,
+                "error": job["error"] if job else record.get("error")
+            })
+
+        status = batch["status"]
+        if status == "processing" and not counts.get("queued") and not counts.get("running"):
+            status = "completed"
+
+        return {
+            "batch_id": batch["batch_id"],
+            "name": batch["name"],
+            "workflow_id": batch["workflow_id"],
+            "status": status,
+            "error": batch["error"],
+            "files_total": len(files),
+            "progress": counts,
+            "files": files,
+            "created_at": batch["created_at"],
+            "updated_at": batch["updated_at"]
+        }
+
+    # ------------------------------------------------------------------
+    # Jobs and workers
+    # ------------------------------------------------------------------
+
+    def _set_stage(self, job: Dict[str, Any], stage: str, status: str, error: Optional[str] = None):
+        now = datetime.utcnow().isoformat()
+        stage_status = job["stages"][stage]
+        stage_status["status"] = status
+        if status == "running":
+            stage_status["started_at"] = now
+            job["stage"] = stage
+            job["status"] = "running"
+        else:
+            stage_status["finished_at"] = now
+        if error:
+            stage_status["error"] = error
+        job["updated_at"] = now
+
+    def _finish(self, job: Dict[str, Any], status: str, error: Optional[str] = None):
+        job["status"] = status
+        job["error"] = error
+        job["finished_at"] = datetime.utcnow().isoformat()
+        job["updated_at"] = job["finished_at"]
+        if self._document_jobs.get(job["document_id"]) == job["job_id"]:
+            del self._document_jobs[job["document_id"]]
+
+        # Keep a bounded history of finished jobs
+        finished = [
+            job_id for job_id, record in self.jobs.items()
+            if record["status"] in ("completed", "failed")
+        ]
+        for job_id in finished[:max(0, len(finished) - settings.ingestion_job_history)]:
+            del self.jobs[job_id]
+
+    async def _work(
+        self,
+        stage: str,
+        handler: Callable,
+        next_queue: Optional[asyncio.Queue]
+    ):
+        queue = self._queues[stage]
+        while True:
+            job_id, payload = await queue.get()
+            job = self.jobs[job_id]
+            try:
+                self._set_stage(job, stage, "running")
+                payload = await handler(job, payload)
+                self._set_stage(job, stage, "completed")
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed in {stage} stage: {e}")
+                self._set_stage(job, stage, "failed", str(e))
+                if payload.get("plan"):
+                    # Free the dedup reservations of chunks that were never stored
+                    dedup_service.release(payload["plan"]["ids"])
+                if payload.get("new_document"):
+                    await asyncio.to_thread(
+                        self._discard_document, payload["document_id"], payload["file_path"]
+                    )
+                if payload.get("blob"):
+                    # Only deleted if no committed document references it
+                    blob_service.unpin(payload["blob"]["key"])
+                    await blob_service.release(payload["blob"]["key"])
+                self._finish(job, "failed", str(e))
+                continue
+            finally:
+                queue.task_done()
+
+            if next_queue is not None:
+                await next_queue.put((job_id, payload))
+            else:
+                self._finish(job, "completed")
+                logger.info(f"Ingestion job {job_id} completed for document {payload['document_id']}")
+
+    def start(self):
+        """Start the stage worker pools"""
+        if self._workers:
+            return
+
+        handlers = {
+            "extract": (self._extract, settings.ingestion_extract_workers),
+            "chunk": (self._chunk, settings.ingestion_chunk_workers),
+            "embed": (self._embed, settings.ingestion_embed_concurrency),
+            "index": (self._index, settings.ingestion_index_workers)
+        }
+        for stage in STAGES:
+            self._queues[stage] = asyncio.Queue(maxsize=settings.ingestion_queue_size)
+        for position, stage in enumerate(STAGES):
+            handler, workers = handlers[stage]
+            next_queue = self._queues[STAGES[position + 1]] if position + 1 < len(STAGES) else None
+            for _ in range(max(1, workers)):
+                self._workers.append(asyncio.create_task(self._work(stage, handler, next_queue)))
+
+    async def stop(self):
+        """Cancel the stage workers and archive readers"""
+        tasks = self._workers + list(self._batch_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._queues = {}
+
+    async def submit(
+        self,
+        document_id: int,
+        file_path: str,
+        filename: str,
+        new_document: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Queue a stored document for processing
+
+        Waits while the extract queue is full, so uploads slow down instead
+        of piling up unbounded work.
+
+        Args:
+            document_id: ID of the saved Document row
+            file_path: Path of the uploaded file
+            filename: Original file name
+            new_document: Delete the document and file if processing fails
+
+        Returns:
+            The job record
+        """
+        self.start()
+
+        now = datetime.utcnow().isoformat()
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "document_id": document_id,
+            "filename": filename,
+            "status": "queued",
+            "stage": None,
+            "stages": {stage: {"status": "pending"} for stage in STAGES},
+            "created_at": now,
+            "updated_at": now,
+            "error": None,
+            "result": None
+        }
+        self.jobs[job_id] = job
+        self._document_jobs[document_id] = job_id
+
+        await self._queues["extract"].put((job_id, {
+            "document_id": document_id,
+            "file_path": file_path,
+            "new_document": new_document
+        }))
+        return dict(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a snapshot of a job's status"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {
+            **job,
+            "stages": {stage: dict(status) for stage, status in job["stages"].items()},
+            "queue_depths": {stage: queue.qsize() for stage, queue in self._queues.items()}
+        }
+
+# Global instance
+ingestion_pipeline = IngestionPipeline()
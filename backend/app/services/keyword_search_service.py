@@ -0,0 +1,168 @@
+"""
+Keyword Search Service - Local BM25 inverted index maintained alongside the vector store
+"""
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+from app.core.config import settings
+from app.services.index_journal import IndexJournal
+from app.services.vector_index import matches_where
+
+logger = logging.getLogger(__name__)
+
+# Keep identifiers such as "err-4012", "v2.3.1" and "max_tokens" as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[-.][a-z0-9_]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase BM25 terms"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class KeywordSearchService:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.journal = IndexJournal(settings.bm25_index_path)
+        self.k1 = k1
+        self.b = b
+        self.term_freqs: Dict[str, Dict[str, int]] = {}
+        self.metadatas: Dict[str, Dict[str, Any]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        # Searches run in worker threads while upserts mutate the postings on the loop
+        self._index_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Load persisted term frequencies and rebuild the postings"""
+        try:
+            entries, changes = self.journal.load()
+            for doc_id, entry in entries.items():
+                self._add(doc_id, entry["terms"], entry["metadata"])
+            for change in changes:
+                if change[0] == "add":
+                    self._add(*change[1:])
+                else:
+                    self._remove(change[1])
+            if entries or changes:
+                logger.info(f"Loaded BM25 index with {len(self.term_freqs)} documents")
+        except Exception as e:
+            logger.error(f"Error loading BM25 index: {e}")
+
+    def _snapshot(self) -> Dict[str, Any]:
+        with self._index_lock:
+            return {
+                doc_id: {"terms": terms, "metadata": self.metadatas[doc_id]}
+                for doc_id, terms in self.term_freqs.items()
+            }
+
+    def _add(self, doc_id: str, terms: Dict[str, int], metadata: Dict[str, Any]):
+        self._remove(doc_id)
+        self.term_freqs[doc_id] = terms
+        self.metadatas[doc_id] = metadata
+        self.doc_lengths[doc_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[doc_id]
+        for term, freq in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = freq
+
+    def _remove(self, doc_id: str):
+        terms = self.term_freqs.pop(doc_id, None)
+        if terms is None:
+            return
+        self.metadatas.pop(doc_id, None)
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def add_documents(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ):
+        """Index documents, replacing any existing entries with the same IDs"""
+        metadatas = metadatas or [{} for _ in ids]
+        entries = [
+            (doc_id, dict(Counter(tokenize(document or ""))), metadata or {})
+            for doc_id, document, metadata in zip(ids, documents, metadatas)
+        ]
+        with self._index_lock:
+            for doc_id, terms, metadata in entries:
+                self._add(doc_id, terms, metadata)
+        for doc_id, terms, metadata in entries:
+            self.journal.record(["add", doc_id, terms, metadata])
+
+    def delete_documents(self, ids: List[str]):
+        """Remove documents from the index"""
+        with self._index_lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+        for doc_id in ids:
+            self.journal.record(["delete", doc_id])
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 10,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank indexed documents against a query with BM25
+
+        Returns:
+            List of dicts with "id", "metadata" and "bm25_score", best first
+        """
+        with self._index_lock:
+            return self._search(query, n_results, filter_metadata)
+
+    def _search(
+        self,
+        query: str,
+        n_results: int,
+        filter_metadata: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        doc_count = len(self.term_freqs)
+        if not doc_count:
+            return []
+        avg_length = self.total_length / doc_count
+
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, freq in posting.items():
+                length = self.doc_lengths[doc_id]
+                norm = freq + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for doc_id, score in ranked:
+            if filter_metadata and not matches_where(self.metadatas[doc_id], filter_metadata):
+                continue
+            results.append({
+                "id": doc_id,
+                "metadata": self.metadatas[doc_id],
+                "bm25_score": score
+            })
+            if len(results) >= n_results:
+                break
+        return results
+
+    async def persist(self):
+        """Write the changes since the last persist to disk without blocking the event loop"""
+        try:
+            await self.journal.persist(self._snapshot, len(self.term_freqs))
+        except Exception as e:
+            logger.error(f"Error saving BM25 index: {e}")
+
+# Global instance
+keyword_search_service = KeywordSearchService()
@@ -0,0 +1,59 @@
+"""
+Reranking - Vectorized re-ranking stages for retrieval results
+"""
+from typing import List
+
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Select k candidates balancing relevance against redundancy
+
+    Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * max cosine similarity to the picks so far.
+    The pairwise similarity matrix is computed once and the running maximum is
+    updated with a single vectorized operation per step.
+
+    Args:
+        relevance: Relevance score per candidate, shape (n,)
+        embeddings: Candidate embeddings, shape (n, d)
+        k: Number of candidates to select
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+
+    Returns:
+        Indexes of the selected candidates in selection order
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    similarity = vectors @ vectors.T
+
+    relevance = np.asarray(relevance, dtype=np.float32)
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        max_similarity = np.maximum(max_similarity, similarity[pick])
+
+    return selected
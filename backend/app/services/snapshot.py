@@ -0,0 +1,165 @@
+"""
+Snapshot - Compact columnar export format for vector collections
+
+A snapshot is a single .npz archive written one page of records at a time.
+Each page holds one array per column, prefixed with the page number:
+
+    page<n>_embeddings            float32 (rows, d)
+    page<n>_ids_data/_offsets     UTF-8 bytes of all ids and their end offsets
+    page<n>_documents_*           same layout for document texts
+    page<n>_metadatas_*           same layout for JSON-encoded metadata
+    header                        JSON with format version, count, dimension
+                                  and page count
+
+Strings are packed Arrow-style into one byte buffer plus an offsets array,
+so loading never needs pickle and vectors can be read straight into NumPy.
+Writing and reading both hold a single page in memory.
+"""
+import json
+import os
+import zipfile
+from typing import List, Dict, Any, Optional, Iterator
+
+import numpy as np
+
+SNAPSHOT_VERSION = 2
+
+COLUMNS = ("ids", "documents", "metadatas")
+
+
+def _pack_strings(values: List[str]) -> Dict[str, np.ndarray]:
+    """Pack strings into a byte buffer and cumulative end offsets"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return {"data": data, "offsets": offsets}
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Inverse of _pack_strings"""
+    buffer = data.tobytes()
+    values = []
+    start = 0
+    for end in offsets.tolist():
+        values.append(buffer[start:end].decode("utf-8"))
+        start = end
+    return values
+
+
+class SnapshotWriter:
+    """
+    Write a collection snapshot page by page
+
+    The archive is built in a temporary file and moved into place by
+    close(), so a failed export never leaves a partial snapshot behind.
+    """
+
+    def __init__(self, path: str, compress: bool = True, extra: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            path: Target .npz file
+            compress: Deflate the archive members
+            extra: Additional fields stored in the header
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.extra = extra or {}
+        self.count = 0
+        self.pages = 0
+        self.dimension: Optional[int] = None
+        self._archive = zipfile.ZipFile(
+            self.tmp_path,
+            "w",
+            compression=zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED,
+            allowZip64=True
+        )
+
+    def _write_array(self, name: str, array: np.ndarray):
+        with self._archive.open(f"{name}.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+    def write_page(
+        self,
+        ids: List[str],
+        documents: List[Optional[str]],
+        metadatas: List[Optional[Dict[str, Any]]],
+        embeddings: List[List[float]]
+    ):
+        """Append one page of records; all vectors must share one dimension"""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match {self.dimension}")
+
+        prefix = f"page{self.pages}_"
+        self._write_array(f"{prefix}embeddings", vectors)
+        for name, values in (
+            ("ids", ids),
+            ("documents", [document or "" for document in documents]),
+            ("metadatas", [json.dumps(metadata or {}) for metadata in metadatas])
+        ):
+            packed = _pack_strings(values)
+            self._write_array(f"{prefix}{name}_data", packed["data"])
+            self._write_array(f"{prefix}{name}_offsets", packed["offsets"])
+
+        self.pages += 1
+        self.count += len(ids)
+
+    def close(self) -> Dict[str, Any]:
+        """Write the header and move the snapshot into place"""
+        header = {
+            "version": SNAPSHOT_VERSION,
+            "count": self.count,
+            "dimension": self.dimension or 0,
+            "pages": self.pages,
+            **self.extra
+        }
+        self._write_array("header", np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8))
+        self._archive.close()
+        os.replace(self.tmp_path, self.path)
+        return header
+
+    def abort(self):
+        """Discard a partially written snapshot"""
+        self._archive.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def read_snapshot_header(path: str) -> Dict[str, Any]:
+    """Read and validate a snapshot's header"""
+    with np.load(path, allow_pickle=False) as archive:
+        header = json.loads(archive["header"].tobytes().decode("utf-8"))
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+    return header
+
+
+def iter_snapshot_pages(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Load a snapshot one page at a time
+
+    Yields:
+        Dicts with ids, documents, metadatas and a (rows, d) float32 embeddings array
+    """
+    header = read_snapshot_header(path)
+    with np.load(path, allow_pickle=False) as archive:
+        for prefix in (f"page{n}_" for n in range(header["pages"])):
+            columns = {
+                name: _unpack_strings(archive[f"{prefix}{name}_data"], archive[f"{prefix}{name}_offsets"])
+                for name in COLUMNS
+            }
+            if not columns["ids"]:
+                continue
+            yield {
+                "ids": columns["ids"],
+                "documents": columns["documents"],
+                "metadatas": [json.loads(metadata) for metadata in columns["metadatas"]],
+                "embeddings": archive[f"{prefix}embeddings"]
+            }
@@ -0,0 +1,171 @@
+"""
+Text Processing - CPU-bound ingestion helpers
+
+These functions are module level and free of service state so they can be
+pickled and executed in the ingestion process pool.
+"""
+import hashlib
+import io
+import re
+from typing import List, Union, Iterable, Iterator, Optional, Tuple
+
+
+def compute_content_hash(content: Union[str, bytes]) -> str:
+    """Compute a SHA-256 hex digest of document content"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def count_pdf_pages(source: Union[str, bytes]) -> int:
+    """Count the pages of a PDF file path or byte string"""
+    with _open_pdf(source) as pdf:
+        return pdf.page_count
+
+
+def extract_pdf_pages(source: Union[str, bytes], start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """
+    Extract the text of a range of PDF pages
+
+    Each call opens its own handle so page ranges of one file can be
+    extracted in parallel by separate worker processes.
+    """
+    with _open_pdf(source) as pdf:
+        stop = pdf.page_count if stop is None else min(stop, pdf.page_count)
+        return [pdf.load_page(page).get_text() for page in range(start, stop)]
+
+
+def _open_pdf(source: Union[str, bytes]):
+    import fitz  # PyMuPDF
+
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def extract_docx_blocks(source: Union[str, bytes]) -> List[str]:
+    """Extract paragraph and table text from a DOCX file path or byte string"""
+    import docx
+
+    document = docx.Document(io.BytesIO(source) if isinstance(source, bytes) else source)
+    blocks = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            blocks.append("\t".join(cell.text for cell in row.cells))
+    return blocks
+
+
+class StreamChunker:
+    """
+    Split text fed piece by piece into overlapping chunks
+
+    Produces the same chunks as chunking the concatenated pieces, but only
+    keeps about one chunk of text buffered. The state is small and
+    picklable, so a document can be chunked across several process pool
+    tasks a window of pieces at a time.
+    """
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.buffer = ""
+        self.base = 0  # Absolute offset of buffer[0]
+        self.start = 0  # Absolute offset of the next chunk
+        self.emitted = False
+
+    def _next_chunk(self, text_end: Optional[int]) -> str:
+        # One step of the chunking loop over buffer, with offsets kept absolute
+        start = self.start
+        end = start + self.chunk_size
+        chunk = self.buffer[start - self.base:end - self.base]
+
+        # Try to break at sentence boundary
+        if text_end is None or end < text_end:
+            last_period = chunk.rfind('.')
+            last_newline = chunk.rfind('\n')
+            break_point = max(last_period, last_newline)
+
+            if break_point > start + self.chunk_size // 2:  # Only break if it's not too short
+                chunk = chunk[:break_point + 1]
+                end = start + break_point + 1
+
+        self.start = end - self.overlap
+        return chunk.strip()
+
+    def feed(self, piece: str) -> List[str]:
+        """Add a piece of text; returns the chunks it completes"""
+        chunks = []
+        self.buffer += piece
+        # Emit while more text is known to follow the current window
+        while self.base + len(self.buffer) > self.start + self.chunk_size:
+            chunks.append(self._next_chunk(None))
+            self.emitted = True
+        if self.start > self.base:
+            self.buffer = self.buffer[self.start - self.base:]
+            self.base = self.start
+        return chunks
+
+    def finish(self) -> List[str]:
+        """Chunk the remaining text once no more pieces follow"""
+        text_end = self.base + len(self.buffer)
+        if not self.emitted and text_end <= self.chunk_size:
+            return [self.buffer]
+
+        chunks = []
+        while self.start < text_end:
+            chunks.append(self._next_chunk(text_end))
+            if self.start >= text_end:
+                break
+        return chunks
+
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int = 1000, overlap: int = 200) -> Iterator[str]:
+    """Split a stream of text pieces into overlapping chunks"""
+    chunker = StreamChunker(chunk_size, overlap)
+    for piece in pieces:
+        yield from chunker.feed(piece)
+    yield from chunker.finish()
+
+
+def chunk_window(chunker: StreamChunker, pieces: List[str], final: bool) -> Tuple[StreamChunker, List[str]]:
+    """Feed one window of pieces to a chunker; returns its new state and the completed chunks"""
+    chunks = [chunk for piece in pieces for chunk in chunker.feed(piece)]
+    if final:
+        chunks.extend(chunker.finish())
+    return chunker, chunks
+
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    """Split text into overlapping chunks"""
+    return list(iter_chunks([text], chunk_size, overlap))
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """Compute a 64-bit SimHash fingerprint over word shingles"""
+    tokens = re.findall(r"\w+", text.lower())
+    if len(tokens) < shingle_size:
+        shingles = tokens
+    else:
+        shingles = [
+            " ".join(tokens[i:i + shingle_size])
+            for i in range(len(tokens) - shingle_size + 1)
+        ]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def simhash_chunks(chunks: List[str]) -> List[int]:
+    """Fingerprint a document's chunks in one process pool task"""
+    return [simhash(chunk) for chunk in chunks]
@@ -0,0 +1,530 @@
+"""
+Vector Index - Embedded IVF vector store persisted to memory-mapped files
+
+LocalVectorCollection mirrors the subset of the Chroma collection API used by
+ChromaService, so it can be selected as a drop-in single-node backend.
+
+On-disk layout (one directory per collection):
+    manifest.json           dimension, segment names and deleted positions
+    centroids.npy           IVF centroids (absent until the index is large enough)
+    seg_<n>.npy             float32 unit vectors of one write batch (memory-mapped)
+    seg_<n>.assign.npy      int32 IVF list of each vector
+    seg_<n>.json            ids, documents and metadatas of the batch
+"""
+import json
+import logging
+import os
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style metadata filter"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$lte" and not (value is not None and value <= operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class LocalVectorCollection:
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        nprobe: int = 8,
+        min_ivf_size: int = 4096,
+        indexed_fields: tuple = ("workflow_id", "document_id")
+    ):
+        self.name = name
+        self.path = os.path.join(path, name)
+        self.nprobe = nprobe
+        self.min_ivf_size = min_ivf_size
+        self._lock = threading.RLock()
+
+        self.dimension: Optional[int] = None
+        self.centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._segment_names: List[str] = []
+        self._vectors: List[np.ndarray] = []
+        self._assignments: List[np.ndarray] = []
+        self._offsets: List[int] = []
+        self._ids: List[str] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._deleted: set = set()
+        self._id_to_pos: Dict[str, int] = {}
+        # Equality index on partition fields so filtered queries only touch the partition
+        self._field_index: Dict[str, Dict[Any, set]] = {field: {} for field in indexed_fields}
+        self._next_segment = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _file(self, filename: str) -> str:
+        return os.path.join(self.path, filename)
+
+    def _atomic_save_npy(self, filename: str, array: np.ndarray):
+        tmp_path = self._file(f"{filename}.tmp.npy")
+        np.save(tmp_path, array)
+        os.replace(tmp_path, self._file(filename))
+
+    def _atomic_save_json(self, filename: str, data: Any):
+        tmp_path = self._file(f"{filename}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._file(filename))
+
+    def _load(self):
+        """Memory-map persisted segments; vectors are paged in lazily by the OS"""
+        manifest_path = self._file("manifest.json")
+        if not os.path.exists(manifest_path):
+            return
+
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+        self.dimension = manifest.get("dimension")
+        self._trained_size = manifest.get("trained_size", 0)
+        self._next_segment = manifest.get("next_segment", 0)
+        if os.path.exists(self._file("centroids.npy")):
+            self.centroids = np.load(self._file("centroids.npy"))
+
+        for segment in manifest.get("segments", []):
+            with open(self._file(f"{segment}.json"), "r") as f:
+                records = json.load(f)
+            self._append_segment(
+                segment,
+                np.load(self._file(f"{segment}.npy"), mmap_mode="r"),
+                np.load(self._file(f"{segment}.assign.npy"), mmap_mode="r"),
+                records["ids"],
+                records["documents"],
+                records["metadatas"]
+            )
+
+        for pos in manifest.get("deleted", []):
+            self._kill(pos)
+
+        logger.info(f"Loaded local vector index '{self.name}' with {self.count()} vectors")
+
+    def _save_manifest(self):
+        self._atomic_save_json("manifest.json", {
+            "dimension": self.dimension,
+            "trained_size": self._trained_size,
+            "next_segment": self._next_segment,
+            "segments": self._segment_names,
+            "deleted": sorted(self._deleted)
+        })
+
+    def _append_segment(
+        self,
+        segment: str,
+        vectors: np.ndarray,
+        assignments: np.ndarray,
+        ids: List[str],
+        documents: List[Optional[str]],
+        metadatas: List[Dict[str, Any]]
+    ):
+        offset = len(self._ids)
+        self._segment_names.append(segment)
+        self._vectors.append(vectors)
+        self._assignments.append(assignments)
+        self._offsets.append(offset)
+        self._ids.extend(ids)
+        self._documents.extend(documents)
+        self._metadatas.extend(metadatas)
+        for i, doc_id in enumerate(ids):
+            previous = self._id_to_pos.get(doc_id)
+            if previous is not None:
+                self._kill(previous)
+            self._id_to_pos[doc_id] = offset + i
+            for field, index in self._field_index.items():
+                value = metadatas[i].get(field)
+                if value is not None:
+                    index.setdefault(value, set()).add(offset + i)
+
+    def _kill(self, pos: int):
+        """Tombstone a position and drop it from the id map and field indexes"""
+        self._deleted.add(pos)
+        if self._id_to_pos.get(self._ids[pos]) == pos:
+            del self._id_to_pos[self._ids[pos]]
+        for field, index in self._field_index.items():
+            value = self._metadatas[pos].get(field)
+            if value in index:
+                index[value].discard(pos)
+                if not index[value]:
+                    del index[value]
+
+    # ------------------------------------------------------------------
+    # IVF
+    # ------------------------------------------------------------------
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.zeros(len(vectors), dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _train(self, iterations: int = 10):
+        """Train IVF centroids with spherical k-means and reassign every vector"""
+        alive = self._alive_positions()
+        nlist = max(1, int(np.sqrt(len(alive))))
+        rng = np.random.default_rng(0)
+        sample_size = min(len(alive), nlist * 64)
+        sample = self._gather(rng.choice(alive, size=sample_size, replace=False))
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for k in range(nlist):
+                members = sample[labels == k]
+                if len(members):
+                    centroids[k] = members.mean(axis=0)
+            centroids = _normalize(centroids).astype(np.float32)
+
+        self.centroids = centroids
+        self._trained_size = len(alive)
+        self._atomic_save_npy("centroids.npy", centroids)
+
+        for i, segment in enumerate(self._segment_names):
+            assignments = self._assign(np.asarray(self._vectors[i]))
+            self._atomic_save_npy(f"{segment}.assign.npy", assignments)
+            self._assignments[i] = assignments
+
+        logger.info(f"Trained {nlist} IVF lists over {len(alive)} vectors")
+
+    def _maybe_train(self):
+        """Retrain once the index is large enough or has grown 4x since training"""
+        alive = self.count()
+        if alive < self.min_ivf_size:
+            return
+        if self.centroids is None or alive >= 4 * self._trained_size:
+            self._train()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _gather(self, positions) -> np.ndarray:
+        if self.dimension is None or len(positions) == 0:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        positions = np.asarray(positions, dtype=np.int64)
+        segments = np.searchsorted(self._offsets, positions, side="right") - 1
+        gathered = np.empty((len(positions), self.dimension), dtype=np.float32)
+        for segment in np.unique(segments):
+            mask = segments == segment
+            gathered[mask] = self._vectors[segment][positions[mask] - self._offsets[segment]]
+        return gathered
+
+    def _alive_positions(self) -> np.ndarray:
+        return np.array(sorted(self._id_to_pos.values()), dtype=np.int64)
+
+    def _indexed_candidates(self, where: Dict[str, Any]) -> Optional[set]:
+        """
+        Superset of positions matching where, from the field indexes
+
+        Returns None when the filter does not constrain any indexed field,
+        in which case every live position has to be checked.
+        """
+        if "$or" in where:
+            union = set()
+            for clause in where["$or"]:
+                found = self._indexed_candidates(clause)
+                if found is None:
+                    return None
+                union |= found
+            return union
+
+        candidates = None
+        for clause in [where] + list(where.get("$and", [])):
+            for field, index in self._field_index.items():
+                value = clause.get(field)
+                if isinstance(value, dict):
+                    if "$in" in value:
+                        found = set().union(*(index.get(v, set()) for v in value["$in"]))
+                    elif "$eq" in value:
+                        found = index.get(value["$eq"], set())
+                    else:
+                        continue
+                elif value is not None:
+                    found = index.get(value, set())
+                else:
+                    continue
+                candidates = found if candidates is None else candidates & found
+        return candidates
+
+    def _filtered_positions(self, where: Optional[Dict[str, Any]]) -> List[int]:
+        candidates = self._indexed_candidates(where) if where else None
+        if candidates is None:
+            candidates = self._id_to_pos.values()
+        return [
+            pos for pos in sorted(candidates)
+            if matches_where(self._metadatas[pos], where)
+        ]
+
+    def _result(self, positions: List[int], include: List[str]) -> Dict[str, Any]:
+        return {
+            "ids": [self._ids[pos] for pos in positions],
+            "documents": [self._documents[pos] for pos in positions] if "documents" in include else None,
+            "metadatas": [self._metadatas[pos] for pos in positions] if "metadatas" in include else None,
+            "embeddings": self._gather(positions).tolist() if "embeddings" in include else None
+        }
+
+    # ------------------------------------------------------------------
+    # Collection API
+    # ------------------------------------------------------------------
+
+    def upsert(
+        self,
+        ids: List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        documents: Optional[List[str]] = None
+    ):
+        """Write a batch as a new segment; replaced ids are tombstoned"""
+        if embeddings is None:
+            raise ValueError("LocalVectorCollection requires precomputed embeddings")
+
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dimension}"
+                )
+
+            segment = f"seg_{self._next_segment}"
+            self._next_segment += 1
+            assignments = self._assign(vectors)
+
+            self._atomic_save_npy(f"{segment}.npy", vectors)
+            self._atomic_save_npy(f"{segment}.assign.npy", assignments)
+            self._atomic_save_json(f"{segment}.json", {
+                "ids": list(ids),
+                "documents": list(documents) if documents else [None] * len(ids),
+                "metadatas": list(metadatas) if metadatas else [{} for _ in ids]
+            })
+
+            self._append_segment(
+                segment,
+                np.load(self._file(f"{segment}.npy"), mmap_mode="r"),
+                assignments,
+                list(ids),
+                list(documents) if documents else [None] * len(ids),
+                list(metadatas) if metadatas else [{} for _ in ids]
+            )
+            self._maybe_train()
+            self._save_manifest()
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        self.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def query(
+        self,
+        query_embeddings: Optional[List[List[float]]] = None,
+        query_texts: Optional[List[str]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Return the nearest neighbours of each query by cosine distance"""
+        if query_embeddings is None:
+            raise ValueError("LocalVectorCollection requires query embeddings")
+        include = include or ["documents", "metadatas", "distances"]
+
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+
+        with self._lock:
+            allowed = self._filtered_positions(where) if where else None
+            for query in queries:
+                positions, scores = self._search(query, n_results, allowed)
+                batch = self._result(positions, include)
+                results["ids"].append(batch["ids"])
+                results["documents"].append(batch["documents"])
+                results["metadatas"].append(batch["metadatas"])
+                results["embeddings"].append(batch["embeddings"])
+                results["distances"].append([float(1 - score) for score in scores])
+
+        return results
+
+    def _search(self, query: np.ndarray, k: int, allowed: Optional[List[int]]):
+        if allowed is not None:
+            # Filtered queries scan only their partition, exactly
+            if not allowed:
+                return [], []
+            scores = self._gather(allowed) @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [allowed[i] for i in top], scores[top].tolist()
+
+        probes = None
+        if self.centroids is not None:
+            nprobe = min(self.nprobe, len(self.centroids))
+            probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        deleted = np.fromiter(self._deleted, dtype=np.int64) if self._deleted else None
+
+        candidate_positions = []
+        candidate_scores = []
+        for i, vectors in enumerate(self._vectors):
+            offset = self._offsets[i]
+            positions = np.arange(offset, offset + len(vectors))
+            mask = np.ones(len(vectors), dtype=bool)
+            if probes is not None:
+                mask &= np.isin(self._assignments[i], probes)
+            if deleted is not None:
+                mask &= ~np.isin(positions, deleted)
+            rows = np.nonzero(mask)[0]
+            if not len(rows):
+                continue
+            candidate_positions.append(rows + offset)
+            candidate_scores.append(np.asarray(vectors[rows]) @ query)
+
+        if not candidate_positions:
+            return [], []
+
+        positions = np.concatenate(candidate_positions)
+        scores = np.concatenate(candidate_scores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return positions[top].tolist(), scores[top].tolist()
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Fetch records by id and/or metadata filter"""
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            if ids is not None:
+                positions = [
+                    self._id_to_pos[doc_id] for doc_id in ids
+                    if doc_id in self._id_to_pos and matches_where(self._metadatas[self._id_to_pos[doc_id]], where)
+                ]
+            else:
+                positions = self._filtered_positions(where)
+            start = offset or 0
+            positions = positions[start:start + limit] if limit is not None else positions[start:]
+            return self._result(positions, include)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Tombstone records; space is reclaimed by compact()"""
+        with self._lock:
+            if ids is not None:
+                positions = [self._id_to_pos[doc_id] for doc_id in ids if doc_id in self._id_to_pos]
+            else:
+                positions = self._filtered_positions(where)
+            for pos in positions:
+                self._kill(pos)
+            self._save_manifest()
+
+    def count(self) -> int:
+        return len(self._id_to_pos)
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Rewrite live vectors into a single segment and drop tombstones
+
+        The new segment and manifest are written before old files are removed,
+        so a crash mid-compaction leaves the previous state loadable.
+        """
+        with self._lock:
+            removed = len(self._deleted)
+            old_segments = list(self._segment_names)
+            positions = self._alive_positions()
+
+            ids = [self._ids[pos] for pos in positions]
+            documents = [self._documents[pos] for pos in positions]
+            metadatas = [self._metadatas[pos] for pos in positions]
+            vectors = self._gather(positions) if len(positions) else None
+
+            self._segment_names = []
+            self._vectors = []
+            self._assignments = []
+            self._offsets = []
+            self._ids = []
+            self._documents = []
+            self._metadatas = []
+            self._deleted = set()
+            self._id_to_pos = {}
+            self._field_index = {field: {} for field in self._field_index}
+
+            if vectors is not None:
+                segment = f"seg_{self._next_segment}"
+                self._next_segment += 1
+                assignments = self._assign(vectors)
+                self._atomic_save_npy(f"{segment}.npy", vectors)
+                self._atomic_save_npy(f"{segment}.assign.npy", assignments)
+                self._atomic_save_json(f"{segment}.json", {
+                    "ids": ids,
+                    "documents": documents,
+                    "metadatas": metadatas
+                })
+                self._append_segment(
+                    segment,
+                    np.load(self._file(f"{segment}.npy"), mmap_mode="r"),
+                    assignments,
+                    ids,
+                    documents,
+                    metadatas
+                )
+            self._save_manifest()
+
+            for segment in old_segments:
+                for suffix in (".npy", ".assign.npy", ".json"):
+                    try:
+                        os.remove(self._file(f"{segment}{suffix}"))
+                    except FileNotFoundError:
+                        pass
+
+            logger.info(f"Compacted local vector index '{self.name}', removed {removed} tombstones")
+
+            return {
+                "segments_merged": len(old_segments),
+                "tombstones_removed": removed,
+                "vectors": len(ids)
+            }
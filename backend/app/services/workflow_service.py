@@ -9,9 +9,11 @@ import uuid
 
 from app.services.llm_service import llm_service
 from app.services.chroma_service import chroma_service
+from app.services.embedding_service import embedding_service
 from app.services.search_service import search_service
 from app.database.models import Workflow, Component, ChatSession, ChatMessage
-from app.database.connection import get_db
+from app.database.queries import linked_document_ids
+from app.database.connection import SessionLocal
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +26,67 @@ class WorkflowService:
             "output": self._handle_output
         }
     
+    # Database access is synchronous; these run in worker threads so
+    # executions do not block the event loop
+    
+    def _get_workflow(self, workflow_id: str) -> Optional[Workflow]:
+        db = SessionLocal()
+        try:
+            return db.query(Workflow).filter(Workflow.id == workflow_id).first()
+        finally:
+            db.close()
+    
+    def _create_chat_session(self, session_id: str, workflow_id: str):
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            db.add(ChatSession(
+                id=session_id,
+                workflow_id=workflow_id,
+                created_at=now,
+                last_activity_at=now
+            ))
+            db.commit()
+        finally:
+            db.close()
+    
+    def _save_exchange(self, session_id: str, user_input: str, response: str):
+        """Store the user input and the workflow's response as chat messages"""
+        db = SessionLocal()
+        try:
+            db.add(ChatMessage(
+                id=str(uuid.uuid4()),
+                session_id=session_id,
+                content=user_input,
+                is_user=True,
+                created_at=datetime.utcnow()
+            ))
+            db.add(ChatMessage(
+                id=str(uuid.uuid4()),
+                session_id=session_id,
+                content=response,
+                is_user=False,
+                created_at=datetime.utcnow()
+            ))
+            # Keep the session's listing columns in step with its messages
+            db.query(ChatSession).filter(ChatSession.id == session_id).update(
+                {
+                    ChatSession.message_count: ChatSession.message_count + 2,
+                    ChatSession.last_activity_at: datetime.utcnow()
+                },
+                synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+    
     async def execute_workflow(
         self,
         workflow_id: str,
         user_input: str,
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        prefetched_search: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> Dict[str, Any]:
         """
         Execute a workflow with user input
@@ -37,14 +95,15 @@ class WorkflowService:
             workflow_id: ID of the workflow to execute
             user_input: User's input query
             session_id: Chat session ID
+            prefetched_search: Knowledge base search results by component ID
+            query_embedding: Precomputed embedding of the user input
             
         Returns:
             Dict containing execution results
         """
         try:
             # Get workflow from database
-            db = next(get_db())
-            workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+            workflow = await asyncio.to_thread(self._get_workflow, workflow_id)
             
             if not workflow:
                 return {
@@ -55,13 +114,7 @@ class WorkflowService:
             # Create or get chat session
             if not session_id:
                 session_id = str(uuid.uuid4())
-                chat_session = ChatSession(
-                    id=session_id,
-                    workflow_id=workflow_id,
-                    created_at=datetime.utcnow()
-                )
-                db.add(chat_session)
-                db.commit()
+                await asyncio.to_thread(self._create_chat_session, session_id, workflow_id)
             
             # Parse workflow components
             components = self._parse_workflow_components(workflow.definition)
@@ -71,6 +124,8 @@ class WorkflowService:
                 "user_input": user_input,
                 "session_id": session_id,
                 "workflow_id": workflow_id,
+                "prefetched_search": prefetched_search or {},
+                "query_embedding": query_embedding,
                 "intermediate_results": {},
                 "final_result": None
             }
@@ -83,25 +138,17 @@ class WorkflowService:
                 if component["type"] == "output":
                     execution_context["final_result"] = result
             
-            # Save chat message
-            chat_message = ChatMessage(
-                id=str(uuid.uuid4()),
-                session_id=session_id,
-                content=user_input,
-                is_user=True,
-                created_at=datetime.utcnow()
-            )
-            db.add(chat_message)
+            # Prefetched candidates and the query vector are internal; keep them out of the response
+            execution_context.pop("prefetched_search")
+            execution_context.pop("query_embedding")
             
-            response_message = ChatMessage(
-                id=str(uuid.uuid4()),
-                session_id=session_id,
-                content=execution_context["final_result"].get("content", ""),
-                is_user=False,
-                created_at=datetime.utcnow()
+            # Save chat messages
+            await asyncio.to_thread(
+                self._save_exchange,
+                session_id,
+                user_input,
+                execution_context["final_result"].get("content", "")
             )
-            db.add(response_message)
-            db.commit()
             
             logger.info(f"Workflow {workflow_id} executed successfully")
             
@@ -118,8 +165,82 @@ class WorkflowService:
                 "success": False,
                 "error": str(e)
             }
-        finally:
-            db.close()
+    
+    async def execute_workflow_batch(
+        self,
+        workflow_id: str,
+        user_inputs: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Execute a workflow for several inputs
+        
+        Vector knowledge base retrieval for all inputs is done up front in a
+        single batch search, then each input runs through the workflow
+        concurrently with its results prefetched.
+        
+        Args:
+            workflow_id: ID of the workflow to execute
+            user_inputs: User input queries
+            
+        Returns:
+            Dict containing one execution result per input
+        """
+        try:
+            workflow = await asyncio.to_thread(self._get_workflow, workflow_id)
+            
+            if not workflow:
+                return {
+                    "success": False,
+                    "error": "Workflow not found"
+                }
+            
+            components = self._parse_workflow_components(workflow.definition)
+            
+            # Embed every input once; retrieval stages reuse these vectors
+            query_embeddings: List[Optional[List[float]]] = [None] * len(user_inputs)
+            if embedding_service.available and any(component["type"] == "knowledge_base" for component in components):
+                query_embeddings = await embedding_service.generate_embeddings(user_inputs) or query_embeddings
+            
+            prefetched = [{} for _ in user_inputs]
+            for component in components:
+                config = component["config"]
+                if component["type"] != "knowledge_base" or config.get("search_mode", "vector") != "vector":
+                    continue
+                
+                max_results = config.get("max_results", 5)
+                use_mmr = config.get("rerank") == "mmr"
+                search_results = await self._search_knowledge_base_batch(
+                    workflow_id,
+                    config,
+                    user_inputs,
+                    config.get("fetch_k", max_results * 4) if use_mmr else max_results,
+                    use_mmr,
+                    query_embeddings
+                )
+                for i, search_result in enumerate(search_results):
+                    prefetched[i][component["id"]] = search_result
+            
+            results = await asyncio.gather(*(
+                self.execute_workflow(
+                    workflow_id=workflow_id,
+                    user_input=user_input,
+                    prefetched_search=prefetched[i],
+                    query_embedding=query_embeddings[i]
+                )
+                for i, user_input in enumerate(user_inputs)
+            ))
+            
+            return {
+                "success": all(result["success"] for result in results),
+                "results": list(results)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error executing workflow batch: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
     
     def _parse_workflow_components(self, workflow_definition: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Parse workflow definition to get ordered components"""
@@ -214,12 +335,38 @@ class WorkflowService:
         config = component["config"]
         user_input = context["user_input"]
         
-        # Search for relevant documents
-        search_result = await chroma_service.search_documents(
-            query=user_input,
-            n_results=config.get("max_results", 5),
-            similarity_threshold=config.get("similarity_threshold", 0.7)
-        )
+        max_results = config.get("max_results", 5)
+        use_mmr = config.get("rerank") == "mmr"
+        n_results = config.get("fetch_k", max_results * 4) if use_mmr else max_results
+        
+        # Embed the input once per execution and share it across components
+        if context.get("query_embedding") is None and embedding_service.available:
+            context["query_embedding"] = await embedding_service.generate_single_embedding(user_input) or None
+        
+        # Search for relevant documents, over-fetching candidates for re-ranking
+        prefetched = context.get("prefetched_search", {}).get(component["id"])
+        if prefetched is not None:
+            search_result = prefetched
+        elif config.get("search_mode", "vector") == "hybrid":
+            search_result = await chroma_service.hybrid_search(
+                query=user_input,
+                n_results=n_results,
+                similarity_threshold=config.get("similarity_threshold", 0.7),
+                filter_metadata=await self.workflow_filter(context["workflow_id"]),
+                query_embedding=context["query_embedding"]
+            )
+        else:
+            search_result = (await self._search_knowledge_base_batch(
+                context["workflow_id"], config, [user_input], n_results, use_mmr,
+                [context["query_embedding"]]
+            ))[0]
+        
+        if search_result["success"] and use_mmr:
+            search_result["results"] = await chroma_service.rerank_mmr(
+                search_result["results"],
+                n_results=max_results,
+                lambda_mult=config.get("mmr_lambda", 0.5)
+            )
         
         if search_result["success"]:
             # Combine search results into context
@@ -241,6 +388,97 @@ class WorkflowService:
                 "content": ""
             }
     
+    def _expand_query(self, config: Dict[str, Any], user_input: str) -> List[str]:
+        """Build the query variants searched for one input"""
+        expansions = [
+            template.format(query=user_input)
+            for template in config.get("query_expansions", [])
+        ]
+        return [user_input] + expansions
+    
+    def _linked_document_ids(self, workflow_id: int) -> List[str]:
+        db = SessionLocal()
+        try:
+            return [str(document_id) for document_id in db.scalars(linked_document_ids(workflow_id))]
+        finally:
+            db.close()
+    
+    async def workflow_filter(self, workflow_id: str) -> Dict[str, Any]:
+        """
+        Restrict knowledge base search to the workflow's own documents
+        
+        Deduplicated uploads keep their vectors under the workflow that first
+        stored them; other workflows they are linked into match them by id.
+        The link lookup runs in a worker thread to keep the event loop free.
+        """
+        linked = await asyncio.to_thread(self._linked_document_ids, int(workflow_id))
+        
+        partition = {"workflow_id": int(workflow_id)}
+        if not linked:
+            return partition
+        return {"$or": [partition, {"document_id": {"$in": linked}}]}
+    
+    async def _search_knowledge_base_batch(
+        self,
+        workflow_id: str,
+        config: Dict[str, Any],
+        user_inputs: List[str],
+        n_results: int,
+        include_embeddings: bool = False,
+        query_embeddings: Optional[List[Optional[List[float]]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Run vector retrieval for many inputs and their query expansions in one round-trip
+        
+        Results of the variants of one input are merged by chunk id, keeping
+        the best similarity score. query_embeddings, aligned with user_inputs,
+        are reused for the original inputs; expansions are embedded as needed.
+        """
+        groups = [self._expand_query(config, user_input) for user_input in user_inputs]
+        variant_embeddings = []
+        for i, group in enumerate(groups):
+            variant_embeddings.append(query_embeddings[i] if query_embeddings else None)
+            variant_embeddings.extend([None] * (len(group) - 1))
+        batch_result = await chroma_service.search_documents_batch(
+            queries=[query for group in groups for query in group],
+            n_results=n_results,
+            similarity_threshold=config.get("similarity_threshold", 0.7),
+            filter_metadata=await self.workflow_filter(workflow_id),
+            include_embeddings=include_embeddings,
+            query_embeddings=variant_embeddings
+        )
+        
+        if not batch_result["success"]:
+            return [
+                {"success": False, "error": batch_result["error"], "results": []}
+                for _ in user_inputs
+            ]
+        
+        search_results = []
+        position = 0
+        for group in groups:
+            merged: Dict[str, Dict[str, Any]] = {}
+            for query_result in batch_result["results"][position:position + len(group)]:
+                for result in query_result["results"]:
+                    current = merged.get(result["id"])
+                    if current is None or result["similarity_score"] > current["similarity_score"]:
+                        merged[result["id"]] = result
+            position += len(group)
+            
+            ranked = sorted(merged.values(), key=lambda result: result["similarity_score"], reverse=True)
+            ranked = [
+                {**result, "rank": rank}
+                for rank, result in enumerate(ranked[:n_results], start=1)
+            ]
+            search_results.append({
+                "success": True,
+                "query": group[0],
+                "results": ranked,
+                "total_found": len(ranked)
+            })
+        
+        return search_results
+    
     async def _handle_llm_engine(
         self,
         component: Dict[str, Any],
@@ -0,0 +1,8 @@
+"""
+Shared test setup
+"""
+import os
+
+# The app's engines are created at import; without a configured database
+# point them at SQLite, which needs no server or PostgreSQL drivers
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
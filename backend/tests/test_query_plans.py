@@ -0,0 +1,7 @@
+"""
+Query plan regression tests for the chat and document hot paths
+"""
+from app.database.check_query_plans import run_checks
+
+def test_hot_queries_use_their_indexes():
+    assert run_checks() == []
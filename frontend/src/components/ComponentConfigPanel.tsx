@@ -94,6 +94,38 @@ const ComponentConfigPanel: React.FC<ComponentConfigPanelProps> = ({
                 {((configuration.similarity_threshold || 0.7) * 100).toFixed(0)}%
               </div>
             </div>
+            <div>
+              <label className="block text-sm font-medium text-gray-700 mb-1">
+                Search Mode
+              </label>
+              <select
+                value={configuration.search_mode || 'vector'}
+                onChange={(e) => onConfigurationChange({
+                  ...configuration,
+                  search_mode: e.target.value as 'vector' | 'hybrid'
+                })}
+                className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500"
+              >
+                <option value="vector">Vector Similarity</option>
+                <option value="hybrid">Hybrid (Keyword + Vector)</option>
+              </select>
+            </div>
+            <div>
+              <label className="block text-sm font-medium text-gray-700 mb-1">
+                Re-ranking
+              </label>
+              <select
+                value={configuration.rerank || 'none'}
+                onChange={(e) => onConfigurationChange({
+                  ...configuration,
+                  rerank: e.target.value as 'none' | 'mmr'
+                })}
+                className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500"
+              >
+                <option value="none">None</option>
+                <option value="mmr">Diversify (MMR)</option>
+              </select>
+            </div>
           </div>
         );
 
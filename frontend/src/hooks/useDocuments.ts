@@ -4,16 +4,19 @@ import { documentApi } from '../services/api';
 
 export const useDocuments = (workflowId?: number) => {
   const [documents, setDocuments] = useState<Document[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | undefined>();
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
+  // Loads the first page; further pages are fetched on demand
   const loadDocuments = useCallback(async () => {
     setLoading(true);
     setError(null);
     
     try {
-      const data = await documentApi.getDocuments(workflowId);
-      setDocuments(data);
+      const page = await documentApi.getDocuments(workflowId);
+      setDocuments(page.documents);
+      setNextCursor(page.nextCursor);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load documents');
     } finally {
@@ -21,6 +24,24 @@ export const useDocuments = (workflowId?: number) => {
     }
   }, [workflowId]);
 
+  const loadMoreDocuments = useCallback(async () => {
+    if (!nextCursor) {
+      return;
+    }
+    setLoading(true);
+    setError(null);
+    
+    try {
+      const page = await documentApi.getDocuments(workflowId, nextCursor);
+      setDocuments(prev => [...prev, ...page.documents]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'Failed to load documents');
+    } finally {
+      setLoading(false);
+    }
+  }, [workflowId, nextCursor]);
+
   const uploadDocument = useCallback(async (file: File) => {
     setLoading(true);
     setError(null);
@@ -42,14 +63,14 @@ export const useDocuments = (workflowId?: number) => {
     setError(null);
     
     try {
-      await documentApi.deleteDocument(id);
+      await documentApi.deleteDocument(id, workflowId);
       setDocuments(prev => prev.filter(doc => doc.id !== id));
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to delete document');
     } finally {
       setLoading(false);
     }
-  }, []);
+  }, [workflowId]);
 
   const processDocument = useCallback(async (id: number) => {
     setLoading(true);
@@ -78,9 +99,11 @@ export const useDocuments = (workflowId?: number) => {
 
   return {
     documents,
+    hasMoreDocuments: nextCursor !== undefined,
     loading,
     error,
     loadDocuments,
+    loadMoreDocuments,
     uploadDocument,
     deleteDocument,
     processDocument,
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Workflow, Document, ChatMessage, ChatSession, ComponentConfiguration } from '../types';
+import { Workflow, Document, DocumentPage, ChatMessage, ChatSession, ComponentConfiguration } from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
@@ -50,11 +50,17 @@ export const workflowApi = {
 
 // Document API
 export const documentApi = {
-  // Get all documents
-  getDocuments: async (workflowId?: number): Promise<Document[]> => {
-    const params = workflowId ? { workflow_id: workflowId } : {};
+  // Get one page of documents; pass the previous page's nextCursor to continue
+  getDocuments: async (workflowId?: number, after?: string): Promise<DocumentPage> => {
+    const params: Record<string, any> = workflowId ? { workflow_id: workflowId } : {};
+    if (after) {
+      params.after = after;
+    }
     const response = await api.get('/api/documents', { params });
-    return response.data;
+    return {
+      documents: response.data,
+      nextCursor: response.headers['x-next-cursor'] || undefined,
+    };
   },
 
   // Get document by ID
@@ -79,9 +85,17 @@ export const documentApi = {
     return response.data;
   },
 
-  // Delete document
-  deleteDocument: async (id: number): Promise<void> => {
-    await api.delete(`/api/documents/${id}`);
+  // Get ingestion job progress for an upload
+  getIngestionJob: async (jobId: string): Promise<any> => {
+    const response = await api.get(`/api/documents/jobs/${jobId}`);
+    return response.data;
+  },
+
+  // Delete document; with a workflow it is only removed from that workflow
+  // while other workflows still use it
+  deleteDocument: async (id: number, workflowId?: number): Promise<void> => {
+    const params = workflowId ? { workflow_id: workflowId } : {};
+    await api.delete(`/api/documents/${id}`, { params });
   },
 
   // Process document
@@ -39,6 +39,10 @@ export interface ComponentConfiguration {
   // Knowledge Base Component
   max_results?: number;
   similarity_threshold?: number;
+  search_mode?: 'vector' | 'hybrid';
+  rerank?: 'none' | 'mmr';
+  mmr_lambda?: number;
+  fetch_k?: number;
   
   // LLM Engine Component
   model?: string;
@@ -71,6 +75,12 @@ export interface Document {
   updated_at?: string;
 }
 
+// One page of the document listing; nextCursor is absent on the last page
+export interface DocumentPage {
+  documents: Document[];
+  nextCursor?: string;
+}
+
 export interface ChatMessage {
   id: number;
   content: string;